@@ -9,53 +9,9 @@ AIComps: Production-ready, modular AI components for document and text processin
 
 from .tasks.version import __version__
 
-# Export commonly used components from tasks subpackage
-from .tasks import (
-    # Documents
-    Audio2TextDoc,
-    Base64ByteStrDoc,
-    DocPath,
-    EmbedDoc,
-    GeneratedDoc,
-    LLMParamsDoc,
-    SearchedDoc,
-    SearchedMultimodalDoc,
-    RerankedDoc,
-    TextDoc,
-    MetadataTextDoc,
-    RAGASParams,
-    RAGASScores,
-    LVMDoc,
-    LVMVideoDoc,
-    ImagePath,
-    ImagesPath,
-    VideoPath,
-    ImageDoc,
-    SDOutputs,
-    TextImageDoc,
-    MultimodalDoc,
-    EmbedMultimodalDoc,
-    FactualityDoc,
-    ScoreDoc,
-    PIIRequestDoc,
-    PIIResponseDoc,
-    Audio2text,
-    DocSumDoc,
-    PromptTemplateInput,
-    TranslationInput,
-    
-    # Constants
-    MegaServiceEndpoint,
-    ServiceRoleType,
-    ServiceType,
-    
-    # Microservice
-    ServiceOrchestrator,
-    ServiceOrchestratorWithYaml,
-    MicroService,
-    register_microservice,
-    opea_microservices,
-)
+# The components listed in __all__ are re-exported from the tasks subpackage and, as there, only imported on first
+# access, so that `import AIComps` stays cheap and does not pull in the orchestrator or its dependencies.
+from . import tasks as _tasks
 
 __all__ = [
     "__version__",
@@ -94,6 +50,7 @@ __all__ = [
     
     # Constants
     "MegaServiceEndpoint",
+    "RequestPriority",
     "ServiceRoleType",
     "ServiceType",
     
@@ -104,3 +61,15 @@ __all__ = [
     "register_microservice",
     "opea_microservices",
 ]
+
+
+def __getattr__(name):
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(_tasks, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
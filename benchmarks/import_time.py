@@ -0,0 +1,75 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""Measure the cold import time of AIComps entry points.
+
+Each statement runs in a fresh interpreter, so nothing is cached in sys.modules, and the median of the runs is
+reported. With --top, the modules with the highest cumulative import time (python -X importtime) are listed too.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --top 15 "from AIComps import MicroService"
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+DEFAULT_STATEMENTS = [
+    "import AIComps",
+    "from AIComps import TextDoc",
+    "from AIComps.tasks import CustomLogger",
+    "from AIComps import MicroService",
+    "from AIComps import ServiceOrchestrator",
+    "import AIComps.tasks.text.dataprep.src.utils",
+]
+
+_TIMER = "import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+
+
+def time_statement(statement, runs):
+    """Return the import times in seconds of statement over runs fresh interpreters, None if it fails."""
+    times = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", _TIMER.format(statement=statement)], capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()
+            print(f"{statement!r} failed: {error[-1] if error else result.returncode}", file=sys.stderr)
+            return None
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def top_imports(statement, count):
+    """Return the count modules with the highest cumulative import time for statement, as (seconds, module)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        modules.append((int(cumulative) / 1e6, module.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time of AIComps")
+    parser.add_argument("statements", nargs="*", default=DEFAULT_STATEMENTS, help="import statements to time")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per statement")
+    parser.add_argument("--top", type=int, default=0, help="list the slowest modules imported by each statement")
+    args = parser.parse_args()
+
+    print(f"{'statement':<50} {'median':>9} {'min':>9}")
+    for statement in args.statements:
+        times = time_statement(statement, args.runs)
+        if times is None:
+            continue
+        print(f"{statement:<50} {statistics.median(times) * 1000:>7.1f}ms {min(times) * 1000:>7.1f}ms")
+        for seconds, module in top_imports(statement, args.top):
+            print(f"    {seconds * 1000:>7.1f}ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+"""Measure the per-token overhead of the orchestrator streaming metrics.
+
+Compares a direct histogram update per token with the buffered StreamMeter, and times token_generator, which also
+splits the sentences and formats the SSE events.
+
+    python benchmarks/stream_metrics.py --tokens 200000
+"""
+
+import argparse
+import time
+
+from AIComps.tasks.cores.mega.orchestrator import ServiceOrchestrator, _metrics
+
+SENTENCE = "The quick brown fox jumps over the lazy dog, isn't it? Très bien.\\n Next line. "
+
+
+def per_token(func, tokens):
+    start = time.perf_counter()
+    func(tokens)
+    return (time.perf_counter() - start) / tokens * 1e9
+
+
+def direct(tokens):
+    token_start = time.monotonic()
+    for i in range(tokens):
+        token_start = _metrics.token_update(token_start, i == 0)
+
+
+def buffered(tokens):
+    meter = _metrics.stream_meter("benchmark")
+    token_start = time.monotonic()
+    for i in range(tokens):
+        token_start = meter.token(token_start, i == 0, 5)
+    meter.flush()
+
+
+def generator(tokens):
+    orchestrator = ServiceOrchestrator()
+    sentence = SENTENCE * 100
+    produced = 0
+    token_start = time.monotonic()
+    while produced < tokens:
+        for _ in orchestrator.token_generator(sentence, token_start, False, False, service="benchmark"):
+            produced += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-token overhead of the streaming metrics")
+    parser.add_argument("--tokens", type=int, default=200000, help="tokens recorded per measurement")
+    args = parser.parse_args()
+
+    print(f"histogram update per token   {per_token(direct, args.tokens):8.0f} ns/token")
+    print(f"StreamMeter.token            {per_token(buffered, args.tokens):8.0f} ns/token")
+    print(f"token_generator (end to end) {per_token(generator, args.tokens):8.0f} ns/token")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
 import os
+from typing import List, Optional
 
 import aiohttp
 import requests
 
 from AIComps.tasks import CustomLogger, OpeaComponent, OpeaComponentRegistry, ServiceType
+from AIComps.tasks.cores.mega.batching import pack_requests
 from AIComps.tasks.cores.mega.utils import get_access_token
-from AIComps.tasks.cores.proto.api_protocol import EmbeddingRequest, EmbeddingResponse
+from AIComps.tasks.cores.proto.api_protocol import (
+    EmbeddingRequest,
+    EmbeddingResponse,
+    EmbeddingResponseData,
+    UsageInfo,
+)
+from AIComps.tasks.cores.proto.embedding_codec import encode_embedding
 
 logger = CustomLogger("opea_ovms_embedding")
 logflag = os.getenv("LOGFLAG", False)
@@ -16,6 +25,8 @@ TOKEN_URL = os.getenv("TOKEN_URL")
 CLIENTID = os.getenv("CLIENTID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 MODEL_ID = os.getenv("MODEL_ID")
+# texts per /v3/embeddings call of a dynamic batch
+OVMS_MAX_BATCH_TEXTS = int(os.getenv("OVMS_MAX_BATCH_TEXTS", 32))
 
 
 @OpeaComponentRegistry.register("OPEA_OVMS_EMBEDDING")
@@ -44,16 +55,97 @@ class OpeaOVMSEmbedding(OpeaComponent):
         Returns:
             EmbeddingResponse: The response in OpenAI embedding format, including embeddings, model, and usage information.
         """
+        texts = self._parse_texts(input)
+
+        # OVMS only knows the OpenAI formats, the smaller ones are encoded here
+        encoding_format = input.encoding_format or "float"
+        upstream_format = encoding_format if encoding_format in ("float", "base64") else "float"
+        embeddings = await self._embed(texts, upstream_format, input.user)
+
+        response = EmbeddingResponse(**embeddings)
+        response.encoding_format = encoding_format
+        if upstream_format != encoding_format:
+            for item in response.data:
+                item.embedding = encode_embedding(item.embedding, encoding_format)
+        return response
+
+    async def invoke_batch(self, inputs: List[EmbeddingRequest]) -> list:
+        """Embeds the texts of several requests with as few /v3/embeddings calls as possible.
+
+        Requests of the same user and upstream format are packed, whole, into calls of at most OVMS_MAX_BATCH_TEXTS
+        texts sent concurrently, so a failing call only fails its own requests. The token usage of a call is shared
+        by its requests in proportion to the length of their texts.
+
+        Args:
+            inputs (List[EmbeddingRequest]): The requests of a dynamic batch.
+
+        Returns:
+            list: One EmbeddingResponse per request, or the exception raised for it.
+        """
+        results = [None] * len(inputs)
+        groups = {}  # (user, upstream format) -> [(index, texts)]
+        for i, input in enumerate(inputs):
+            try:
+                texts = self._parse_texts(input)
+            except (TypeError, ValueError) as e:
+                results[i] = e
+                continue
+            encoding_format = input.encoding_format or "float"
+            upstream_format = encoding_format if encoding_format in ("float", "base64") else "float"
+            groups.setdefault((input.user, upstream_format), []).append((i, texts))
+
+        calls = [
+            (user, upstream_format, call)
+            for (user, upstream_format), requests_texts in groups.items()
+            for call in pack_requests(requests_texts, OVMS_MAX_BATCH_TEXTS)
+        ]
+        responses = await asyncio.gather(
+            *(
+                self._embed([text for _, texts in call for text in texts], upstream_format, user)
+                for user, upstream_format, call in calls
+            ),
+            return_exceptions=True,
+        )
+        for (_, upstream_format, call), embeddings in zip(calls, responses):
+            if isinstance(embeddings, BaseException):
+                for i, _ in call:
+                    results[i] = embeddings
+                continue
+            data = sorted(embeddings["data"], key=lambda item: item["index"])
+            usages = split_usage(embeddings.get("usage"), [sum(map(len, texts)) for _, texts in call])
+            start = 0
+            for (i, texts), usage in zip(call, usages):
+                encoding_format = inputs[i].encoding_format or "float"
+                items = [
+                    EmbeddingResponseData(
+                        index=j,
+                        embedding=(
+                            item["embedding"]
+                            if encoding_format == upstream_format
+                            else encode_embedding(item["embedding"], encoding_format)
+                        ),
+                    )
+                    for j, item in enumerate(data[start : start + len(texts)])
+                ]
+                results[i] = EmbeddingResponse(
+                    model=embeddings.get("model"), data=items, usage=usage, encoding_format=encoding_format
+                )
+                start += len(texts)
+        return results
+
+    def _parse_texts(self, input: EmbeddingRequest) -> List[str]:
         # Parse input according to the EmbeddingRequest format
         if isinstance(input.input, str):
-            texts = [input.input.replace("\n", " ")]
+            return [input.input.replace("\n", " ")]
         elif isinstance(input.input, list):
             if all(isinstance(item, str) for item in input.input):
-                texts = [text.replace("\n", " ") for text in input.input]
+                return [text.replace("\n", " ") for text in input.input]
             else:
                 raise ValueError("Invalid input format: Only string or list of strings are supported.")
         else:
             raise TypeError("Unsupported input type: input must be a string or list of strings.")
+
+    async def _embed(self, texts: List[str], encoding_format: str, user: Optional[str]) -> dict:
         # Build headers
         headers = {"Content-Type": "application/json"}
         access_token = (
@@ -65,9 +157,9 @@ class OpeaOVMSEmbedding(OpeaComponent):
         # Compose request
         payload = {
             "input": texts,
-            "encoding_format": input.encoding_format,
+            "encoding_format": encoding_format,
             "model": MODEL_ID,
-            "user": input.user,
+            "user": user,
         }
 
         # Send async POST request using aiohttp
@@ -77,9 +169,7 @@ class OpeaOVMSEmbedding(OpeaComponent):
                 if resp.status != 200:
                     logger.error(f"Embedding service error: {resp.status} - {await resp.text()}")
                     raise RuntimeError(f"Failed to fetch embeddings: HTTP {resp.status}")
-                embeddings = await resp.json()
-
-        return EmbeddingResponse(**embeddings)
+                return await resp.json()
 
     def check_health(self) -> bool:
         """Checks the health of the embedding service.
@@ -97,3 +187,25 @@ class OpeaOVMSEmbedding(OpeaComponent):
             # Handle connection errors, timeouts, etc.
             logger.error(f"Health check failed: {e}")
         return False
+
+
+def split_usage(usage: Optional[dict], weights: List[int]) -> List[Optional[UsageInfo]]:
+    """Split the token usage of a call between its requests in proportion to their weights, the parts sum up to it."""
+    if not usage:
+        return [None] * len(weights)
+    if not any(weights):
+        weights = [1] * len(weights)
+    total = sum(weights)
+    parts = {}
+    for key in ("prompt_tokens", "total_tokens"):
+        tokens = usage.get(key) or 0
+        shares = [tokens * weight // total for weight in weights]
+        # the tokens lost to rounding go to the requests with the largest remainders
+        by_remainder = sorted(range(len(weights)), key=lambda j: tokens * weights[j] % total, reverse=True)
+        for j in by_remainder[: tokens - sum(shares)]:
+            shares[j] += 1
+        parts[key] = shares
+    return [
+        UsageInfo(prompt_tokens=prompt_tokens, total_tokens=total_tokens)
+        for prompt_tokens, total_tokens in zip(parts["prompt_tokens"], parts["total_tokens"])
+    ]
@@ -1,6 +1,7 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
 import json
 import os
 from typing import List, Union
@@ -9,14 +10,18 @@ import requests
 from huggingface_hub import AsyncInferenceClient
 
 from AIComps.tasks import CustomLogger, OpeaComponent, OpeaComponentRegistry, ServiceType
+from AIComps.tasks.cores.mega.batching import pack_requests
 from AIComps.tasks.cores.mega.utils import get_access_token
 from AIComps.tasks.cores.proto.api_protocol import EmbeddingRequest, EmbeddingResponse, EmbeddingResponseData
+from AIComps.tasks.cores.proto.embedding_codec import encode_embedding
 
 logger = CustomLogger("opea_tei_embedding")
 logflag = os.getenv("LOGFLAG", False)
 TOKEN_URL = os.getenv("TOKEN_URL")
 CLIENTID = os.getenv("CLIENTID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
+# texts per /embed call of a dynamic batch, at most the --max-client-batch-size of the TEI server
+TEI_MAX_CLIENT_BATCH_SIZE = int(os.getenv("TEI_MAX_CLIENT_BATCH_SIZE", 32))
 
 
 @OpeaComponentRegistry.register("OPEA_TEI_EMBEDDING")
@@ -58,23 +63,72 @@ class OpeaTEIEmbedding(OpeaComponent):
         Returns:
             EmbeddingResponse: The response in OpenAI embedding format, including embeddings, model, and usage information.
         """
+        texts = self._parse_texts(input)
+        # feature_extraction return np.ndarray
+        response = await self.client.feature_extraction(text=texts, model=f"{self.base_url}/embed")
+        return self._build_response(response, input)
+
+    async def invoke_batch(self, inputs: List[EmbeddingRequest]) -> list:
+        """Embeds the texts of several requests with as few feature_extraction calls as possible.
+
+        The requests are packed, whole, into calls of at most TEI_MAX_CLIENT_BATCH_SIZE texts sent concurrently, so a
+        batch is never rejected for its size and a failing call only fails its own requests.
+
+        Args:
+            inputs (List[EmbeddingRequest]): The requests of a dynamic batch.
+
+        Returns:
+            list: One EmbeddingResponse per request, or the exception raised for it.
+        """
+        results = [None] * len(inputs)
+        requests_texts = []
+        for i, input in enumerate(inputs):
+            try:
+                requests_texts.append((i, self._parse_texts(input)))
+            except (TypeError, ValueError) as e:
+                results[i] = e
+
+        calls = pack_requests(requests_texts, TEI_MAX_CLIENT_BATCH_SIZE)
+        responses = await asyncio.gather(
+            *(
+                self.client.feature_extraction(
+                    text=[text for _, texts in call for text in texts], model=f"{self.base_url}/embed"
+                )
+                for call in calls
+            ),
+            return_exceptions=True,
+        )
+        for call, embeddings in zip(calls, responses):
+            start = 0
+            for i, texts in call:
+                if isinstance(embeddings, BaseException):
+                    results[i] = embeddings
+                else:
+                    results[i] = self._build_response(embeddings[start : start + len(texts)], inputs[i])
+                start += len(texts)
+        return results
+
+    def _parse_texts(self, input: EmbeddingRequest) -> List[str]:
         # Parse input according to the EmbeddingRequest format
         if isinstance(input.input, str):
-            texts = [input.input.replace("\n", " ")]
+            return [input.input.replace("\n", " ")]
         elif isinstance(input.input, list):
             if all(isinstance(item, str) for item in input.input):
-                texts = [text.replace("\n", " ") for text in input.input]
+                return [text.replace("\n", " ") for text in input.input]
             else:
                 raise ValueError("Invalid input format: Only string or list of strings are supported.")
         else:
             raise TypeError("Unsupported input type: input must be a string or list of strings.")
-        # feature_extraction return np.ndarray
-        response = await self.client.feature_extraction(text=texts, model=f"{self.base_url}/embed")
-        # Convert np.ndarray to a list of lists (embedding)
-        data = [EmbeddingResponseData(index=i, embedding=embedding.tolist()) for i, embedding in enumerate(response)]
+
+    def _build_response(self, embeddings, input: EmbeddingRequest) -> EmbeddingResponse:
+        # Convert np.ndarray to a list of floats, or to a base64 string 4x smaller than the JSON floats
+        encoding_format = input.encoding_format or "float"
+        data = [
+            EmbeddingResponseData(index=i, embedding=encode_embedding(embedding, encoding_format))
+            for i, embedding in enumerate(embeddings)
+        ]
         # Construct the EmbeddingResponse
-        response = EmbeddingResponse(data=data)
-        return response
+        return EmbeddingResponse(data=data, encoding_format=encoding_format)
 
     def check_health(self) -> bool:
         """Checks the health of the embedding service.
@@ -24,6 +24,10 @@ logger = CustomLogger("opea_embedding_microservice")
 logflag = os.getenv("LOGFLAG", False)
 
 embedding_component_name = os.getenv("EMBEDDING_COMPONENT_NAME", "OPEA_TEI_EMBEDDING")
+# merge concurrent requests into one backend call
+DYNAMIC_BATCHING = os.getenv("DYNAMIC_BATCHING", "false").lower() in ("true", "1")
+DYNAMIC_BATCHING_TIMEOUT = float(os.getenv("DYNAMIC_BATCHING_TIMEOUT", 0.01))
+DYNAMIC_BATCHING_MAX_BATCH_SIZE = int(os.getenv("DYNAMIC_BATCHING_MAX_BATCH_SIZE", 32))
 # Initialize OpeaComponentLoader
 loader = OpeaComponentLoader(
     embedding_component_name,
@@ -31,12 +35,20 @@ loader = OpeaComponentLoader(
 )
 
 
+async def embedding_batch(service_type: ServiceType, batch: list) -> list:
+    return await loader.invoke_batch([item["request"] for item in batch])
+
+
 @register_microservice(
     name="opea_service@embedding",
     service_type=ServiceType.EMBEDDING,
     endpoint="/v1/embeddings",
     host="0.0.0.0",
     port=6000,
+    dynamic_batching=DYNAMIC_BATCHING,
+    dynamic_batching_timeout=DYNAMIC_BATCHING_TIMEOUT,
+    dynamic_batching_max_batch_size=DYNAMIC_BATCHING_MAX_BATCH_SIZE,
+    dynamic_batching_func=embedding_batch,
 )
 @opea_telemetry
 @register_statistics(names=["opea_service@embedding"])
@@ -48,8 +60,11 @@ async def embedding(input: EmbeddingRequest) -> EmbeddingResponse:
         logger.info(f"Input received: {input}")
 
     try:
-        # Use the loader to invoke the component
-        embedding_response = await loader.invoke(input)
+        # Use the loader to invoke the component, batched with concurrent requests if enabled
+        if DYNAMIC_BATCHING:
+            embedding_response = await opea_microservices["opea_service@embedding"].dynamic_batching_submit(input)
+        else:
+            embedding_response = await loader.invoke(input)
 
         # Log the result if logging is enabled
         if logflag:
@@ -1,9 +1,10 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
 import json
 import os
-from typing import Union
+from typing import List, Union
 
 import requests
 from huggingface_hub import AsyncInferenceClient
@@ -60,26 +61,60 @@ class OpeaTEIReranking(OpeaComponent):
     ) -> Union[LLMParamsDoc, RerankingResponse, ChatCompletionRequest]:
         """Invokes the reranking service to generate rerankings for the provided input."""
         reranking_results = []
-
         if input.retrieved_docs:
             docs = [doc.text for doc in input.retrieved_docs]
-            if isinstance(input, SearchedDoc):
-                query = input.initial_query
-            else:
-                # for RerankingRequest, ChatCompletionRequest
-                query = input.input
+            for best_response in (await self._rerank(self._query(input), docs))[: input.top_n]:
+                reranking_results.append({"text": docs[best_response["index"]], "score": best_response["score"]})
+        return self._format_results(input, reranking_results)
 
-            response = await self.client.post(
-                json={"query": query, "texts": docs},
-                model=f"{self.base_url}/rerank",
-                task="text-reranking",
-            )
+    async def invoke_batch(self, inputs: List[Union[SearchedDoc, RerankingRequest, ChatCompletionRequest]]) -> list:
+        """Reranks the documents of several requests, with one /rerank call per distinct query.
 
-            for best_response in json.loads(response.decode())[: input.top_n]:
-                reranking_results.append(
-                    {"text": input.retrieved_docs[best_response["index"]].text, "score": best_response["score"]}
-                )
+        The backend scores a single query per call: requests sharing a query are merged into one call over the union
+        of their documents, the others are sent concurrently.
+        """
+        texts_by_query = {}  # query -> {text: position}, ordered
+        for input in inputs:
+            if input.retrieved_docs:
+                texts = texts_by_query.setdefault(self._query(input), {})
+                for doc in input.retrieved_docs:
+                    texts.setdefault(doc.text, len(texts))
+
+        queries = list(texts_by_query)
+        responses = await asyncio.gather(
+            *(self._rerank(query, list(texts_by_query[query])) for query in queries), return_exceptions=True
+        )
+        scores_by_query = {}
+        for query, response in zip(queries, responses):
+            if isinstance(response, BaseException):
+                scores_by_query[query] = response
+            else:
+                texts = list(texts_by_query[query])
+                scores_by_query[query] = {texts[item["index"]]: item["score"] for item in response}
+
+        results = []
+        for input in inputs:
+            reranking_results = []
+            if input.retrieved_docs:
+                scores = scores_by_query[self._query(input)]
+                if isinstance(scores, BaseException):
+                    results.append(scores)
+                    continue
+                docs = [doc.text for doc in input.retrieved_docs]
+                ranked = sorted(range(len(docs)), key=lambda j: scores[docs[j]], reverse=True)[: input.top_n]
+                reranking_results = [{"text": docs[j], "score": scores[docs[j]]} for j in ranked]
+            results.append(self._format_results(input, reranking_results))
+        return results
+
+    def _query(self, input: Union[SearchedDoc, RerankingRequest, ChatCompletionRequest]) -> str:
+        if isinstance(input, SearchedDoc):
+            return input.initial_query
+        # for RerankingRequest, ChatCompletionRequest
+        return input.input
 
+    def _format_results(
+        self, input: Union[SearchedDoc, RerankingRequest, ChatCompletionRequest], reranking_results: List[dict]
+    ) -> Union[LLMParamsDoc, RerankingResponse, ChatCompletionRequest]:
         if isinstance(input, SearchedDoc):
             result = [doc["text"] for doc in reranking_results]
             if logflag:
@@ -102,6 +137,15 @@ class OpeaTEIReranking(OpeaComponent):
                     logger.info(input)
                 return input
 
+    async def _rerank(self, query: str, docs: List[str]) -> List[dict]:
+        """Score docs against query, return [{"index": ..., "score": ...}] best first."""
+        response = await self.client.post(
+            json={"query": query, "texts": docs},
+            model=f"{self.base_url}/rerank",
+            task="text-reranking",
+        )
+        return json.loads(response.decode())
+
     def check_health(self) -> bool:
         """Checks the health of the embedding service.
 
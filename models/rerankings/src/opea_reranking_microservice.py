@@ -26,16 +26,28 @@ logger = CustomLogger("opea_reranking_microservice")
 logflag = os.getenv("LOGFLAG", False)
 
 rerank_component_name = os.getenv("RERANK_COMPONENT_NAME", "OPEA_TEI_RERANKING")
+# merge concurrent requests into as few backend calls as possible
+DYNAMIC_BATCHING = os.getenv("DYNAMIC_BATCHING", "false").lower() in ("true", "1")
+DYNAMIC_BATCHING_TIMEOUT = float(os.getenv("DYNAMIC_BATCHING_TIMEOUT", 0.01))
+DYNAMIC_BATCHING_MAX_BATCH_SIZE = int(os.getenv("DYNAMIC_BATCHING_MAX_BATCH_SIZE", 32))
 # Initialize OpeaComponentLoader
 loader = OpeaComponentLoader(rerank_component_name, description=f"OPEA RERANK Component: {rerank_component_name}")
 
 
+async def reranking_batch(service_type: ServiceType, batch: list) -> list:
+    return await loader.invoke_batch([item["request"] for item in batch])
+
+
 @register_microservice(
     name="opea_service@reranking",
     service_type=ServiceType.RERANK,
     endpoint="/v1/reranking",
     host="0.0.0.0",
     port=8000,
+    dynamic_batching=DYNAMIC_BATCHING,
+    dynamic_batching_timeout=DYNAMIC_BATCHING_TIMEOUT,
+    dynamic_batching_max_batch_size=DYNAMIC_BATCHING_MAX_BATCH_SIZE,
+    dynamic_batching_func=reranking_batch,
 )
 @opea_telemetry
 @register_statistics(names=["opea_service@reranking"])
@@ -49,8 +61,11 @@ async def reranking(
         logger.info(f"Input received: {input}")
 
     try:
-        # Use the loader to invoke the component
-        reranking_response = await loader.invoke(input)
+        # Use the loader to invoke the component, batched with concurrent requests if enabled
+        if DYNAMIC_BATCHING:
+            reranking_response = await opea_microservices["opea_service@reranking"].dynamic_batching_submit(input)
+        else:
+            reranking_response = await loader.invoke(input)
 
         # Log the result if logging is enabled
         if logflag:
@@ -3,59 +3,123 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
-import os
-
-# Document
-from .cores.proto.docarray import (
-    Audio2TextDoc,
-    Base64ByteStrDoc,
-    DocPath,
-    EmbedDoc,
-    GeneratedDoc,
-    LLMParamsDoc,
-    SearchedDoc,
-    SearchedMultimodalDoc,
-    RerankedDoc,
-    TextDoc,
-    MetadataTextDoc,
-    RAGASParams,
-    RAGASScores,
-    LVMDoc,
-    LVMVideoDoc,
-    ImagePath,
-    ImagesPath,
-    VideoPath,
-    ImageDoc,
-    SDOutputs,
-    TextImageDoc,
-    MultimodalDoc,
-    EmbedMultimodalDoc,
-    FactualityDoc,
-    ScoreDoc,
-    PIIRequestDoc,
-    PIIResponseDoc,
-    Audio2text,
-    DocSumDoc,
-    PromptTemplateInput,
-    TranslationInput,
-)
-
-# Constants
-from .cores.mega.constants import MegaServiceEndpoint, ServiceRoleType, ServiceType
-
-# Microservice
-from .cores.mega.orchestrator import ServiceOrchestrator
-from .cores.mega.orchestrator_with_yaml import ServiceOrchestratorWithYaml
-from .cores.mega.micro_service import MicroService, register_microservice, opea_microservices
-
-# Telemetry
-from .cores.telemetry.opea_telemetry import opea_telemetry
-
-# Common
-from .cores.common.component import OpeaComponent, OpeaComponentRegistry, OpeaComponentLoader
-
-# Statistics
-from .cores.mega.base_statistics import statistics_dict, register_statistics
-
-# Logger
-from .cores.mega.logger import CustomLogger
+import importlib
+from typing import TYPE_CHECKING
+
+# The exports are imported on first access (PEP 562), so that importing the package, or one light module of it, does
+# not pull in the orchestrator, docarray, OpenTelemetry and their dependencies.
+# name => module defining it, relative to this package
+_EXPORTS = {
+    # Document
+    "Audio2TextDoc": ".cores.proto.docarray",
+    "Base64ByteStrDoc": ".cores.proto.docarray",
+    "DocPath": ".cores.proto.docarray",
+    "EmbedDoc": ".cores.proto.docarray",
+    "GeneratedDoc": ".cores.proto.docarray",
+    "LLMParamsDoc": ".cores.proto.docarray",
+    "SearchedDoc": ".cores.proto.docarray",
+    "SearchedMultimodalDoc": ".cores.proto.docarray",
+    "RerankedDoc": ".cores.proto.docarray",
+    "TextDoc": ".cores.proto.docarray",
+    "MetadataTextDoc": ".cores.proto.docarray",
+    "RAGASParams": ".cores.proto.docarray",
+    "RAGASScores": ".cores.proto.docarray",
+    "LVMDoc": ".cores.proto.docarray",
+    "LVMVideoDoc": ".cores.proto.docarray",
+    "ImagePath": ".cores.proto.docarray",
+    "ImagesPath": ".cores.proto.docarray",
+    "VideoPath": ".cores.proto.docarray",
+    "ImageDoc": ".cores.proto.docarray",
+    "SDOutputs": ".cores.proto.docarray",
+    "TextImageDoc": ".cores.proto.docarray",
+    "MultimodalDoc": ".cores.proto.docarray",
+    "EmbedMultimodalDoc": ".cores.proto.docarray",
+    "FactualityDoc": ".cores.proto.docarray",
+    "ScoreDoc": ".cores.proto.docarray",
+    "PIIRequestDoc": ".cores.proto.docarray",
+    "PIIResponseDoc": ".cores.proto.docarray",
+    "Audio2text": ".cores.proto.docarray",
+    "DocSumDoc": ".cores.proto.docarray",
+    "PromptTemplateInput": ".cores.proto.docarray",
+    "TranslationInput": ".cores.proto.docarray",
+    # Constants
+    "MegaServiceEndpoint": ".cores.mega.constants",
+    "RequestPriority": ".cores.mega.constants",
+    "ServiceRoleType": ".cores.mega.constants",
+    "ServiceType": ".cores.mega.constants",
+    # Microservice
+    "ServiceOrchestrator": ".cores.mega.orchestrator",
+    "ServiceOrchestratorWithYaml": ".cores.mega.orchestrator_with_yaml",
+    "MicroService": ".cores.mega.micro_service",
+    "register_microservice": ".cores.mega.micro_service",
+    "opea_microservices": ".cores.mega.micro_service",
+    # Telemetry
+    "opea_telemetry": ".cores.telemetry.opea_telemetry",
+    # Common
+    "OpeaComponent": ".cores.common.component",
+    "OpeaComponentRegistry": ".cores.common.component",
+    "OpeaComponentLoader": ".cores.common.component",
+    # Statistics
+    "statistics_dict": ".cores.mega.base_statistics",
+    "register_statistics": ".cores.mega.base_statistics",
+    # Logger
+    "CustomLogger": ".cores.mega.logger",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    # later accesses do not go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+if TYPE_CHECKING:
+    from .cores.common.component import OpeaComponent, OpeaComponentLoader, OpeaComponentRegistry
+    from .cores.mega.base_statistics import register_statistics, statistics_dict
+    from .cores.mega.constants import MegaServiceEndpoint, RequestPriority, ServiceRoleType, ServiceType
+    from .cores.mega.logger import CustomLogger
+    from .cores.mega.micro_service import MicroService, opea_microservices, register_microservice
+    from .cores.mega.orchestrator import ServiceOrchestrator
+    from .cores.mega.orchestrator_with_yaml import ServiceOrchestratorWithYaml
+    from .cores.proto.docarray import (
+        Audio2text,
+        Audio2TextDoc,
+        Base64ByteStrDoc,
+        DocPath,
+        DocSumDoc,
+        EmbedDoc,
+        EmbedMultimodalDoc,
+        FactualityDoc,
+        GeneratedDoc,
+        ImageDoc,
+        ImagePath,
+        ImagesPath,
+        LLMParamsDoc,
+        LVMDoc,
+        LVMVideoDoc,
+        MetadataTextDoc,
+        MultimodalDoc,
+        PIIRequestDoc,
+        PIIResponseDoc,
+        PromptTemplateInput,
+        RAGASParams,
+        RAGASScores,
+        RerankedDoc,
+        ScoreDoc,
+        SDOutputs,
+        SearchedDoc,
+        SearchedMultimodalDoc,
+        TextDoc,
+        TextImageDoc,
+        TranslationInput,
+    )
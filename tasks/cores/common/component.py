@@ -1,6 +1,7 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
 from abc import ABC, abstractmethod
 
 from ..mega.logger import CustomLogger
@@ -77,6 +78,19 @@ class OpeaComponent(ABC):
         """
         raise NotImplementedError("The 'invoke' method must be implemented by subclasses.")
 
+    async def invoke_batch(self, inputs: list) -> list:
+        """Invoke service accessing for several inputs, e.g. a dynamic batch.
+
+        Components whose backend takes batches override it to serve them in one call.
+
+        Args:
+            inputs (list): The inputs of the individual requests.
+
+        Returns:
+            list: One result per input, in order, or the exception raised for that input.
+        """
+        return await asyncio.gather(*(self.invoke(input) for input in inputs), return_exceptions=True)
+
     def __repr__(self):
         """Provides a string representation of the component for debugging and logging purposes.
 
@@ -161,3 +175,11 @@ class OpeaComponentLoader:
         if not hasattr(self.component, "invoke"):
             raise AttributeError(f"The component '{self.component}' does not have an 'invoke' method.")
         return await self.component.invoke(*args, **kwargs)
+
+    async def invoke_batch(self, inputs: list) -> list:
+        """Invoke the loaded component for several inputs at once.
+
+        :param inputs: The inputs of the individual requests
+        :return: One result, or exception, per input
+        """
+        return await self.component.invoke_batch(inputs)
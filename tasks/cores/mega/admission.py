@@ -0,0 +1,178 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter, Gauge
+
+from .logger import CustomLogger
+
+logger = CustomLogger("comps-core-admission")
+
+concurrency_limit = Gauge("megaservice_concurrency_limit", "Current admission concurrency limit (gauge)", ["service"])
+requests_queued = Gauge("megaservice_requests_queued", "Requests waiting for admission (gauge)", ["service"])
+requests_rejected = Counter("megaservice_requests_rejected", "Requests rejected by admission control", ["service"])
+
+# paths that must answer even when the service is saturated
+EXEMPT_PATHS = ("/v1/health_check", "/health", "/v1/statistics", "/metrics")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted, carries the HTTP status and Retry-After to answer with."""
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Bound the number of requests a service works on at the same time.
+
+    Up to `limit` requests run concurrently, up to `max_queue_size` more wait at most `queue_timeout` seconds for a
+    slot. Requests beyond that are rejected right away with 429, requests whose wait expires with 503.
+
+    With `adaptive`, the limit follows AIMD between `min_concurrency` and `max_concurrency`: it grows by about one
+    per limit-many fast replies, and shrinks by `backoff_ratio` when the smoothed latency exceeds
+    `latency_tolerance` times the best recently observed one.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue_size: Optional[int] = None,
+        queue_timeout: float = 1.0,
+        adaptive: bool = False,
+        min_concurrency: int = 1,
+        latency_tolerance: float = 2.0,
+        backoff_ratio: float = 0.9,
+        name: str = "",
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.max_queue_size = max_concurrency if max_queue_size is None else max_queue_size
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.name = name
+
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._waiters = deque()
+        self._latency_ewma = None
+        self._min_latency = None
+        self._samples = 0
+        concurrency_limit.labels(service=self.name).set(self.limit)
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._latency_ewma or self.queue_timeout))
+
+    def _reject(self, status_code: int, reason: str):
+        requests_rejected.labels(service=self.name).inc()
+        raise AdmissionRejected(status_code, self._retry_after(), reason)
+
+    async def acquire(self) -> float:
+        """Wait for a slot, raise AdmissionRejected if none frees up in time.
+
+        :return: the monotonic admission time, to pass to `observe`.
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return time.monotonic()
+        if len(self._waiters) >= self.max_queue_size:
+            self._reject(429, "Too many requests, the service is saturated")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        requests_queued.labels(service=self.name).inc()
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done():
+                # the slot was handed over while the client went away
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            requests_queued.labels(service=self.name).dec()
+        if not waiter.done():
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            self._reject(503, "Service overloaded, request timed out waiting for admission")
+        return time.monotonic()
+
+    def release(self):
+        """Free the slot of a finished request and hand it to the next waiter."""
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def observe(self, latency: float):
+        """Feed the latency of an admitted request, it drives Retry-After and the adaptive limit."""
+        self._latency_ewma = latency if self._latency_ewma is None else 0.9 * self._latency_ewma + 0.1 * latency
+        if not self.adaptive:
+            return
+
+        self._samples += 1
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+        elif self._samples % 1000 == 0:
+            # let the baseline follow lasting latency changes
+            self._min_latency = self._latency_ewma
+
+        if self._latency_ewma > self._min_latency * self.latency_tolerance:
+            self.limit = max(self.min_concurrency, self.limit * self.backoff_ratio)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        concurrency_limit.labels(service=self.name).set(self.limit)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware putting every request, but the debug endpoints, through an AdmissionController.
+
+    A request holds its slot until its response body is complete, so streams count until they end.
+    """
+
+    def __init__(self, app, controller: AdmissionController, exempt_paths: Iterable[str] = EXEMPT_PATHS):
+        self.app = app
+        self.controller = controller
+        self.exempt_paths = set(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            start = await self.controller.acquire()
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": e.reason}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # time to the response head, a stream's length says nothing about the load
+                self.controller.observe(time.monotonic() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.controller.release()
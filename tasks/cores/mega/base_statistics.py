@@ -1,42 +1,92 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
-import numpy as np
+import asyncio
+import glob
+import os
+import time
+
+import orjson
+
+from .quantiles import WINDOWS, WindowedQuantiles
 
 # name => statistic dict
 statistics_dict = {}
 
+# directory where the worker processes of a service share their statistics, set by WorkerPool
+STATISTICS_DIR_ENV = "OPEA_STATISTICS_DIR"
+STATISTICS_SYNC_INTERVAL = float(os.getenv("OPEA_STATISTICS_SYNC_INTERVAL", 5))
+
+
+# quantiles reported for each timing, key suffix -> quantile
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p99.9": 0.999}
+
 
 class BaseStatistics:
-    """Base class to store in-memory statistics of an entity for measurement in one service."""
+    """Base class to store in-memory statistics of an entity for measurement in one service.
+
+    Timings are kept in fixed-size quantile sketches, all-time and over sliding windows, optionally broken down per
+    endpoint.
+    """
 
     def __init__(
         self,
     ):
-        self.response_times = []  # store responses time for all requests
-        self.first_token_latencies = []  # store first token latencies for all requests
+        self.response_times = WindowedQuantiles()  # responses time of all requests
+        self.first_token_latencies = WindowedQuantiles()  # first token latencies of all requests
+        self.endpoints = {}  # endpoint => BaseStatistics of its requests
 
-    def append_latency(self, latency, first_token_latency=None):
-        self.response_times.append(latency)
+    def append_latency(self, latency, first_token_latency=None, endpoint=None):
+        now = time.time()
+        self.response_times.add(latency, now)
         if first_token_latency:
-            self.first_token_latencies.append(first_token_latency)
-
-    def _add_statistics(self, result, stats, suffix):
-        "add P50 (median), P99 and average values for 'stats' array to 'result' dict"
-        if stats:
-            result[f"p50_{suffix}"] = np.percentile(stats, 50)
-            result[f"p99_{suffix}"] = np.percentile(stats, 99)
-            result[f"average_{suffix}"] = np.average(stats)
-        else:
-            result[f"p50_{suffix}"] = None
-            result[f"p99_{suffix}"] = None
-            result[f"average_{suffix}"] = None
+            self.first_token_latencies.add(first_token_latency, now)
+        if endpoint is not None:
+            if endpoint not in self.endpoints:
+                self.endpoints[endpoint] = BaseStatistics()
+            self.endpoints[endpoint].append_latency(latency, first_token_latency)
+
+    def merge(self, other: "BaseStatistics"):
+        "add the timings of 'other', e.g. those of another worker process"
+        self.response_times.merge(other.response_times)
+        self.first_token_latencies.merge(other.first_token_latencies)
+        for endpoint, statistic in other.endpoints.items():
+            self.endpoints.setdefault(endpoint, BaseStatistics()).merge(statistic)
+
+    def to_dict(self):
+        return {
+            "response_times": self.response_times.to_dict(),
+            "first_token_latencies": self.first_token_latencies.to_dict(),
+            "endpoints": {endpoint: statistic.to_dict() for endpoint, statistic in self.endpoints.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        statistic = cls()
+        statistic.response_times = WindowedQuantiles.from_dict(data["response_times"])
+        statistic.first_token_latencies = WindowedQuantiles.from_dict(data["first_token_latencies"])
+        statistic.endpoints = {endpoint: cls.from_dict(values) for endpoint, values in data["endpoints"].items()}
+        return statistic
+
+    def _add_statistics(self, result, sketch, suffix):
+        "add the QUANTILES, average and count of 'sketch' to 'result' dict"
+        for name, value in zip(QUANTILES, sketch.quantiles(QUANTILES.values())):
+            result[f"{name}_{suffix}"] = value
+        result[f"average_{suffix}"] = sketch.average
+        result[f"count_{suffix}"] = sketch.count
 
     def get_statistics(self):
-        "return stats dict with P50, P99 and average values for first token and response timings"
+        "return stats dict with quantiles and average of first token and response timings, all-time and per window"
         result = {}
-        self._add_statistics(result, self.response_times, "latency")
-        self._add_statistics(result, self.first_token_latencies, "latency_first_token")
+        self._add_statistics(result, self.response_times.total, "latency")
+        self._add_statistics(result, self.first_token_latencies.total, "latency_first_token")
+        now = time.time()
+        for window, seconds in WINDOWS.items():
+            windowed = result[window] = {}
+            self._add_statistics(windowed, self.response_times.window(seconds, now), "latency")
+            self._add_statistics(windowed, self.first_token_latencies.window(seconds, now), "latency_first_token")
+        if self.endpoints:
+            result["endpoints"] = {endpoint: stats.get_statistics() for endpoint, stats in self.endpoints.items()}
         return result
 
 
@@ -51,9 +101,57 @@ def register_statistics(
     return decorator
 
 
+def _statistics_path(directory, pid):
+    return os.path.join(directory, f"statistics_{pid}.json")
+
+
+def dump_statistics(directory=None):
+    """Write the statistics of this process where the other workers of the service read them."""
+    directory = directory or os.getenv(STATISTICS_DIR_ENV)
+    if not directory or not statistics_dict:
+        return
+    path = _statistics_path(directory, os.getpid())
+    payload = orjson.dumps({name: statistic.to_dict() for name, statistic in statistics_dict.items()})
+    # readers never see a partial file
+    with open(path + ".tmp", "wb") as f:
+        f.write(payload)
+    os.replace(path + ".tmp", path)
+
+
+async def sync_statistics(interval=STATISTICS_SYNC_INTERVAL):
+    """Dump the statistics of this worker every interval seconds, and once more when cancelled."""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            dump_statistics()
+    finally:
+        dump_statistics()
+
+
+def _merged_statistics(directory):
+    merged = {}
+    for name, statistic in statistics_dict.items():
+        merged[name] = BaseStatistics()
+        merged[name].merge(statistic)
+    own_path = _statistics_path(directory, os.getpid())
+    for path in glob.glob(_statistics_path(directory, "*")):
+        if path == own_path:
+            continue
+        try:
+            with open(path, "rb") as f:
+                data = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            continue
+        for name, values in data.items():
+            merged.setdefault(name, BaseStatistics()).merge(BaseStatistics.from_dict(values))
+    return merged
+
+
 def collect_all_statistics():
     results = {}
-    if statistics_dict:
-        for name, statistic in statistics_dict.items():
+    directory = os.getenv(STATISTICS_DIR_ENV)
+    statistics = _merged_statistics(directory) if directory else statistics_dict
+    if statistics:
+        for name, statistic in statistics.items():
             results[name] = statistic.get_statistics()
     return results
@@ -0,0 +1,166 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Sequence, Tuple
+
+from prometheus_client import Histogram
+
+from .logger import CustomLogger
+
+logger = CustomLogger("comps-core-batching")
+
+batch_size = Histogram(
+    "microservice_batch_size",
+    "Number of requests per dynamic batch",
+    ["service"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+batch_queue_wait = Histogram(
+    "microservice_batch_queue_wait_seconds",
+    "Time requests waited for their dynamic batch to start",
+    ["service"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class DynamicBatcher:
+    """Merge concurrent requests into batches for one inference call.
+
+    A batch is flushed as soon as it holds `max_batch_size` requests, or `timeout` seconds after its oldest request
+    was queued. Up to `max_concurrent_batches` batches run at once, while they do, requests keep queuing and make the
+    next batches bigger.
+
+    `infer` receives the batch as a list of {"request": ..., "response": future} dicts and returns one result per
+    request, in order. A result that is an exception fails only its own request.
+    """
+
+    def __init__(
+        self,
+        infer: Callable[[List[dict]], Awaitable[List[Any]]],
+        max_batch_size: int = 32,
+        timeout: float = 0.01,
+        max_concurrent_batches: int = 1,
+        name: str = "",
+    ):
+        if max_batch_size < 1 or max_concurrent_batches < 1:
+            raise ValueError("max_batch_size and max_concurrent_batches must be at least 1")
+        self.infer = infer
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self.max_concurrent_batches = max_concurrent_batches
+        self.name = name
+        self._queue = deque()
+        self._cond = None
+        self._slots = None
+        self._task = None
+        self._batches = set()
+
+    def __len__(self):
+        return len(self._queue)
+
+    async def submit(self, request: Any) -> Any:
+        """Queue request for the next batch and wait for its result."""
+        if self._task is None or self._task.done():
+            # created on first use, in the loop serving the requests
+            self._cond = asyncio.Condition()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._task = asyncio.create_task(self._batch_loop())
+
+        future = asyncio.get_running_loop().create_future()
+        async with self._cond:
+            self._queue.append({"request": request, "response": future, "enqueued_at": time.monotonic()})
+            self._cond.notify()
+        return await future
+
+    async def _next_batch(self) -> List[dict]:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._queue)
+            deadline = self._queue[0]["enqueued_at"] + self.timeout
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = []
+            while self._queue and len(batch) < self.max_batch_size:
+                item = self._queue.popleft()
+                # skip the callers that went away while queued
+                if not item["response"].done():
+                    batch.append(item)
+            return batch
+
+    async def _batch_loop(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._next_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[dict]):
+        try:
+            start = time.monotonic()
+            batch_size.labels(service=self.name).observe(len(batch))
+            for item in batch:
+                batch_queue_wait.labels(service=self.name).observe(start - item["enqueued_at"])
+
+            try:
+                results = await self.infer(batch)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batched inference returned {len(results)} results for {len(batch)} requests")
+            except Exception as e:
+                logger.error(f"Batched inference of {len(batch)} requests failed: {e}")
+                for item in batch:
+                    if not item["response"].done():
+                        item["response"].set_exception(e)
+                return
+
+            for item, result in zip(batch, results):
+                if item["response"].done():
+                    continue
+                if isinstance(result, BaseException):
+                    item["response"].set_exception(result)
+                else:
+                    item["response"].set_result(result)
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        """Stop batching, the requests still queued fail with CancelledError."""
+        tasks = [task for task in (self._task, *self._batches) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while self._queue:
+            self._queue.popleft()["response"].cancel()
+
+
+def pack_requests(requests: List[Tuple[Any, Sequence]], max_items: int) -> List[list]:
+    """Pack (key, items) requests of a batch, in order and whole, into backend calls of at most max_items items.
+
+    A request holding more than max_items items gets a call of its own, as it would without batching.
+    """
+    calls, call, size = [], [], 0
+    for request in requests:
+        if call and size + len(request[1]) > max_items:
+            calls.append(call)
+            call, size = [], 0
+        call.append(request)
+        size += len(request[1])
+    if call:
+        calls.append(call)
+    return calls
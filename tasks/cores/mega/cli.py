@@ -3,16 +3,18 @@
 
 import argparse
 
-from .exporter import convert_to_docker_compose
-from .manifests_exporter import convert_to_manifests
-
 
+# the exporters pull in the kubernetes client, only import them for the command that needs them
 def export_kubernetes_manifests(mega_yaml, output_file):
+    from .manifests_exporter import convert_to_manifests
+
     print(f"Generating Kubernetes manifests from {mega_yaml} to {output_file}")
     convert_to_manifests(mega_yaml, output_file)
 
 
 def export_docker_compose(mega_yaml, output_file):
+    from .exporter import convert_to_docker_compose
+
     print(f"Generating Docker Compose file from {mega_yaml} to {output_file}")
     convert_to_docker_compose(mega_yaml, output_file)
 
@@ -1,7 +1,7 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
-from enum import Enum, auto
+from enum import Enum, IntEnum, auto
 
 
 class ServiceRoleType(Enum):
@@ -103,3 +103,11 @@ class MCPFuncType(Enum):
     TOOL = auto()
     RESOURCE = auto()
     PROMPT = auto()
+
+
+class RequestPriority(IntEnum):
+    """The enum of a megaservice request priority class, lower values are dispatched first."""
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
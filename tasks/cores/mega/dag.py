@@ -2,18 +2,37 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from collections import OrderedDict, defaultdict
-from copy import deepcopy
 
 
 class DAG(object):
     def __init__(self):
+        self._version = 0
+        self._plan = None
+        self._plan_of = None  # the graph _plan was compiled from
         self.reset_graph()
 
+    def _reverse_index(self):
+        """Return the predecessor map (node -> ordered set of predecessors) kept in sync with graph.
+
+        It is rebuilt if `graph` was replaced from the outside.
+        """
+        if self._reverse_graph_of is not self.graph:
+            reverse_graph = OrderedDict((node, {}) for node in self.graph)
+            for node, edges in self.graph.items():
+                for dep_node in edges:
+                    reverse_graph[dep_node][node] = None
+            self.reverse_graph = reverse_graph
+            self._reverse_graph_of = self.graph
+        return self.reverse_graph
+
     def add_node(self, node_name: str):
         graph = self.graph
         if node_name in graph:
             raise KeyError("node %s already exists" % node_name)
+        reverse_graph = self._reverse_index()
         graph[node_name] = set()
+        reverse_graph[node_name] = {}
+        self._version += 1
 
     def add_node_if_not_exists(self, node_name):
         try:
@@ -25,11 +44,12 @@ class DAG(object):
         graph = self.graph
         if node_name not in graph:
             raise KeyError("node %s does not exist" % node_name)
-        graph.pop(node_name)
-
-        for node, edges in graph.items():
-            if node_name in edges:
-                edges.remove(node_name)
+        reverse_graph = self._reverse_index()
+        for node in reverse_graph.pop(node_name):
+            graph[node].discard(node_name)
+        for dep_node in graph.pop(node_name):
+            reverse_graph[dep_node].pop(node_name, None)
+        self._version += 1
 
     def delete_node_if_exists(self, node_name):
         try:
@@ -41,23 +61,40 @@ class DAG(object):
         graph = self.graph
         if ind_node not in graph or dep_node not in graph:
             raise KeyError("one or more nodes do not exist in graph")
-        test_graph = deepcopy(graph)
-        test_graph[ind_node].add(dep_node)
-        is_valid = self.validate(test_graph)
-        if is_valid:
-            graph[ind_node].add(dep_node)
-        else:
+        if dep_node in graph[ind_node]:
+            return
+        # the new edge closes a cycle iff ind_node is already reachable from dep_node
+        if ind_node == dep_node or self._is_reachable(dep_node, ind_node):
             raise Exception("validation error!")
+        reverse_graph = self._reverse_index()
+        graph[ind_node].add(dep_node)
+        reverse_graph[dep_node][ind_node] = None
+        self._version += 1
+
+    def _is_reachable(self, from_node, to_node):
+        graph = self.graph
+        stack = [from_node]
+        nodes_seen = {from_node}
+        while stack:
+            for dep_node in graph[stack.pop()]:
+                if dep_node == to_node:
+                    return True
+                if dep_node not in nodes_seen:
+                    nodes_seen.add(dep_node)
+                    stack.append(dep_node)
+        return False
 
     def delete_edge(self, ind_node, dep_node):
         graph = self.graph
         if dep_node not in graph.get(ind_node, []):
             raise KeyError("this edge does not exist in graph")
+        reverse_graph = self._reverse_index()
         graph[ind_node].remove(dep_node)
+        reverse_graph[dep_node].pop(ind_node, None)
+        self._version += 1
 
     def predecessors(self, node):
-        graph = self.graph
-        return [key for key in graph if node in graph[key]]
+        return list(self._reverse_index().get(node, ()))
 
     def downstream(self, node) -> list:
         graph = self.graph
@@ -95,6 +132,21 @@ class DAG(object):
 
     def reset_graph(self):
         self.graph = OrderedDict()
+        self.reverse_graph = OrderedDict()
+        self._reverse_graph_of = self.graph
+        self._version += 1
+
+    def compile(self) -> "DAGExecutionPlan":
+        """Return the execution plan of the current graph, rebuilt only after the graph changed.
+
+        Changes are tracked by the DAG methods, and `graph` being replaced from the outside is detected too, but not
+        its in-place changes.
+        """
+        plan = self._plan
+        if plan is None or plan.version != self._version or self._plan_of is not self.graph:
+            self._plan = DAGExecutionPlan(self.graph, self._version)
+            self._plan_of = self.graph
+        return self._plan
 
     def ind_nodes(self, graph=None):
         graph = graph if graph is not None else self.graph
@@ -140,3 +192,129 @@ class DAG(object):
 
     def size(self):
         return len(self.graph)
+
+
+class DAGExecutionPlan(object):
+    """Frozen index of a DAG, compiled once and shared by all requests running on it."""
+
+    def __init__(self, graph, version: int = 0):
+        self.version = version
+        self.nodes = tuple(graph)
+        self.successors = {node: tuple(edges) for node, edges in graph.items()}
+        predecessors = {node: [] for node in graph}
+        for node, edges in graph.items():
+            for dep_node in edges:
+                predecessors[dep_node].append(node)
+        self.predecessors = {node: tuple(preds) for node, preds in predecessors.items()}
+        self.in_degree = {node: len(preds) for node, preds in predecessors.items()}
+        self.ind_nodes = tuple(node for node in self.nodes if not self.in_degree[node])
+
+        topological_order = []
+        in_degree = dict(self.in_degree)
+        ready = list(self.ind_nodes)
+        while ready:
+            node = ready.pop()
+            topological_order.append(node)
+            for dep_node in self.successors[node]:
+                in_degree[dep_node] -= 1
+                if in_degree[dep_node] == 0:
+                    ready.append(dep_node)
+        if len(topological_order) != len(self.nodes):
+            raise ValueError("graph is not acyclic")
+        self.topological_order = tuple(topological_order)
+        self.topological_index = {node: i for i, node in enumerate(self.topological_order)}
+
+
+class RuntimeDAG(DAG):
+    """Per-request view of a DAGExecutionPlan.
+
+    Only deletions are supported, they are recorded in a small overlay and never touch the shared plan.
+    """
+
+    def __init__(self, plan: DAGExecutionPlan):
+        self.plan = plan
+        self.deleted_nodes = set()
+        self.deleted_edges = set()
+
+    @property
+    def graph(self):
+        """Materialize the pruned graph, for callers that need the plain adjacency dict."""
+        return OrderedDict((node, set(self.downstream(node))) for node in self._nodes())
+
+    def _nodes(self):
+        return [node for node in self.plan.nodes if node not in self.deleted_nodes]
+
+    def _is_live(self, ind_node, dep_node):
+        return (
+            ind_node not in self.deleted_nodes
+            and dep_node not in self.deleted_nodes
+            and (ind_node, dep_node) not in self.deleted_edges
+        )
+
+    def add_node(self, node_name: str):
+        raise TypeError("a runtime graph is an immutable view of its plan, nodes can only be deleted from it")
+
+    def add_edge(self, ind_node, dep_node):
+        raise TypeError("a runtime graph is an immutable view of its plan, edges can only be deleted from it")
+
+    def delete_node(self, node_name):
+        if node_name not in self.plan.successors or node_name in self.deleted_nodes:
+            raise KeyError("node %s does not exist" % node_name)
+        self.deleted_nodes.add(node_name)
+
+    def delete_edge(self, ind_node, dep_node):
+        if ind_node in self.deleted_nodes or dep_node not in self.downstream(ind_node):
+            raise KeyError("this edge does not exist in graph")
+        self.deleted_edges.add((ind_node, dep_node))
+
+    def predecessors(self, node):
+        if node in self.deleted_nodes:
+            return []
+        return [pred for pred in self.plan.predecessors.get(node, ()) if self._is_live(pred, node)]
+
+    def downstream(self, node) -> list:
+        if node not in self.plan.successors or node in self.deleted_nodes:
+            raise KeyError("node %s is not in graph" % node)
+        return [dep_node for dep_node in self.plan.successors[node] if self._is_live(node, dep_node)]
+
+    def all_downstreams(self, node):
+        nodes = [node]
+        nodes_seen = set()
+        i = 0
+        while i < len(nodes):
+            for downstream_node in self.downstream(nodes[i]):
+                if downstream_node not in nodes_seen:
+                    nodes_seen.add(downstream_node)
+                    nodes.append(downstream_node)
+            i += 1
+        return sorted(nodes_seen, key=self.plan.topological_index.__getitem__)
+
+    def all_upstreams(self, nodes) -> set:
+        """Return the given nodes and every node with a path to one of them."""
+        nodes = [node for node in nodes if node not in self.deleted_nodes]
+        nodes_seen = set(nodes)
+        while nodes:
+            for upstream_node in self.predecessors(nodes.pop()):
+                if upstream_node not in nodes_seen:
+                    nodes_seen.add(upstream_node)
+                    nodes.append(upstream_node)
+        return nodes_seen
+
+    def all_leaves(self):
+        return [node for node in self._nodes() if not self.downstream(node)]
+
+    def ind_nodes(self, graph=None):
+        if graph is not None:
+            return super().ind_nodes(graph)
+        return [node for node in self._nodes() if not self.predecessors(node)]
+
+    def topological_sort(self, graph=None):
+        if graph is not None:
+            return super().topological_sort(graph)
+        return [node for node in self.plan.topological_order if node not in self.deleted_nodes]
+
+    def reset_graph(self):
+        self.deleted_nodes = set(self.plan.nodes)
+
+    def size(self):
+        return len(self.plan.nodes) - len(self.deleted_nodes)
@@ -4,16 +4,30 @@
 import asyncio
 import logging
 import multiprocessing
+import os
 import re
+import signal
+import threading
 from typing import Optional
 
 from fastapi import FastAPI
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response
 from prometheus_fastapi_instrumentator import Instrumentator
 from uvicorn import Config, Server
 
+from .admission import AdmissionController, AdmissionMiddleware
 from .base_service import BaseService
-from .base_statistics import collect_all_statistics
+from .base_statistics import collect_all_statistics, dump_statistics, sync_statistics
+from .serialization import NegotiatedResponse, NegotiatedRoute
+from .workers import WORKER_DRAIN_SIGNAL, WORKER_GRACEFUL_TIMEOUT, WorkerPool, create_reuseport_socket
+
+# number of worker processes serving each service, see HTTPService.start
+MICROSERVICE_WORKERS = int(os.getenv("MICROSERVICE_WORKERS", 1))
+# on SIGTERM, seconds /health reports not-ready while new connections are still served, set it a bit above the
+# readiness probe period of the load balancer
+MICROSERVICE_DRAIN_DELAY = float(os.getenv("MICROSERVICE_DRAIN_DELAY", 0))
+# then seconds the in-flight requests get to complete before they are cancelled
+MICROSERVICE_DRAIN_TIMEOUT = float(os.getenv("MICROSERVICE_DRAIN_TIMEOUT", 30))
 
 
 class HTTPService(BaseService):
@@ -26,17 +40,22 @@ class HTTPService(BaseService):
         self,
         uvicorn_kwargs: Optional[dict] = None,
         cors: Optional[bool] = True,
+        admission_controller: Optional[AdmissionController] = None,
         **kwargs,
     ):
         """Initialize the HTTPService
         :param uvicorn_kwargs: Dictionary of kwargs arguments that will be passed to Uvicorn server when starting the server
         :param cors: If set, a CORS middleware is added to FastAPI frontend to allow cross-origin access.
+        :param admission_controller: If set, requests are admitted through it and rejected with 429/503 when saturated.
 
         :param kwargs: keyword args
         """
         super().__init__(**kwargs)
         self.uvicorn_kwargs = uvicorn_kwargs or {}
         self.cors = cors
+        self.admission_controller = admission_controller
+        self.draining = False
+        self._drain_task = None
         self._app = self._create_app()
         Instrumentator().instrument(self._app).expose(self._app)
 
@@ -51,7 +70,15 @@ class HTTPService(BaseService):
 
         :return: a FastAPI application.
         """
-        app = FastAPI(title=self.title, description=self.description)
+        app = FastAPI(title=self.title, description=self.description, default_response_class=NegotiatedResponse)
+        # bodies in JSON or msgpack, replies in the format the client accepts
+        app.router.route_class = NegotiatedRoute
+
+        # added first, so the middlewares added after it wrap it, CORS headers included on its 429/503 rejections
+        if self.admission_controller is not None:
+            app.add_middleware(AdmissionMiddleware, controller=self.admission_controller)
+            max_concurrency = self.admission_controller.max_concurrency
+            self.logger.info(f"Admission control is enabled, max concurrency {max_concurrency}.")
 
         if self.cors:
             from fastapi.middleware.cors import CORSMiddleware
@@ -71,15 +98,19 @@ class HTTPService(BaseService):
             tags=["Debug"],
         )
         async def _health_check():
-            """Get the health status of this GenAI microservice."""
+            """Get the health status of this GenAI microservice, 503 once it drains."""
             from AIComps.tasks.version import __version__
 
-            return {"Service Title": self.title, "Version": __version__, "Service Description": self.description}
+            # the probe of the orchestrator replica pools and of existing deployments, it must stop routing here too
+            return JSONResponse(
+                {"Service Title": self.title, "Version": __version__, "Service Description": self.description},
+                status_code=503 if self.draining else 200,
+            )
 
         @app.get("/health")
         async def _health() -> Response:
-            """Health check."""
-            return Response(status_code=200)
+            """Health check, not ready once the service drains."""
+            return Response(status_code=503 if self.draining else 200)
 
         @app.get(
             path="/v1/statistics",
@@ -98,8 +129,27 @@ class HTTPService(BaseService):
         async def startup_event():
             asyncio.create_task(func)
 
-    async def initialize_server(self):
-        """Initialize and return HTTP server."""
+    def add_shutdown_event(self, func):
+        """Await func() when the server shuts down, once it no longer serves requests."""
+
+        @self.app.on_event("shutdown")
+        async def shutdown_event():
+            await func()
+
+    def _server_config(self) -> Config:
+        return Config(
+            app=self.app,
+            host=self.host_address,
+            port=self.primary_port,
+            log_level="info",
+            **self.uvicorn_kwargs,
+        )
+
+    async def initialize_server(self, sockets=None):
+        """Initialize and return HTTP server.
+
+        :param sockets: already bound sockets to listen on, the configured host and port by default.
+        """
         self.logger.info("Setting up HTTP server")
 
         class UviServer(Server):
@@ -125,18 +175,10 @@ class HTTPService(BaseService):
                 """
                 await self.main_loop()
 
-        self.server = UviServer(
-            config=Config(
-                app=self.app,
-                host=self.host_address,
-                port=self.primary_port,
-                log_level="info",
-                **self.uvicorn_kwargs,
-            )
-        )
+        self.server = UviServer(config=self._server_config())
         logging.getLogger("uvicorn.access").addFilter(lambda record: "/v1/health_check" not in record.getMessage())
         self.logger.info(f"Uvicorn server setup on port {self.primary_port}")
-        await self.server.setup_server()
+        await self.server.setup_server(sockets=sockets)
         self.logger.info("HTTP server setup successful")
 
     async def execute_server(self):
@@ -150,20 +192,110 @@ class HTTPService(BaseService):
         await self.server.shutdown()
         self.logger.info("Server termination completed")
 
+    async def drain(self, delay: Optional[float] = None, timeout: Optional[float] = None):
+        """Stop the server without dropping the requests it serves.
+
+        /health reports not-ready for `delay` seconds while requests are still accepted, so load balancers stop
+        routing here. Then the server stops accepting connections, closes keep-alive ones once their current response
+        is sent, and gives the in-flight requests `timeout` seconds to complete before cancelling them.
+        """
+        delay = MICROSERVICE_DRAIN_DELAY if delay is None else delay
+        timeout = MICROSERVICE_DRAIN_TIMEOUT if timeout is None else timeout
+        self.draining = True
+        self.logger.info(f"Draining, not ready for {delay}s then {timeout}s for in-flight requests to complete")
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.server.config.timeout_graceful_shutdown = timeout
+        await self.terminate_server()
+
+    def _start_drain(self) -> bool:
+        """Start draining in the background, return False if it already is."""
+        if self._drain_task is not None:
+            return False
+        self._drain_task = asyncio.create_task(self.drain())
+        return True
+
+    def _on_stop_signal(self):
+        if self._start_drain():
+            return
+        # a second signal does not wait for the drain
+        self.logger.warning("Stop signal received again, exiting without draining")
+        self._drain_task.cancel()
+        self.server.should_exit = True
+        self.server.force_exit = True
+
+    async def _serve(self):
+        """Serve until SIGTERM or SIGINT, then drain.
+
+        Signals can only be handled in the main thread, a service started from another one is stopped with `stop`.
+        """
+        loop = asyncio.get_running_loop()
+        signals = (signal.SIGTERM, signal.SIGINT) if threading.current_thread() is threading.main_thread() else ()
+        for sig in signals:
+            loop.add_signal_handler(sig, self._on_stop_signal)
+        try:
+            await self.execute_server()
+            if self._drain_task is not None:
+                await asyncio.gather(self._drain_task, return_exceptions=True)
+        finally:
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+
     def _async_setup(self):
         self.event_loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.event_loop)
         self.event_loop.run_until_complete(self.initialize_server())
 
-    def start(self):
+    def start(self, workers: Optional[int] = None):
         """Running method to block the main thread.
 
         This method runs the event loop until a Future is done. It is designed to be called in the main thread to keep it busy.
+        The service drains on SIGTERM or SIGINT, see `drain`, and exits right away on a second one.
+
+        :param workers: number of processes serving requests, MICROSERVICE_WORKERS by default. Beyond one, the workers
+            are forked and each binds the port with SO_REUSEPORT, see WorkerPool. Only use it for services whose state
+            may be duplicated per process.
         """
-        self.event_loop.run_until_complete(self.execute_server())
+        workers = workers or MICROSERVICE_WORKERS
+        if workers <= 1:
+            self.event_loop.run_until_complete(self._serve())
+            return
 
-    def stop(self):
+        # the workers bind their own sockets, release the one bound at setup
         self.event_loop.run_until_complete(self.terminate_server())
+        self.event_loop.close()
+        self.logger.info(f"Serving on port {self.primary_port} with {workers} worker processes")
+        graceful_timeout = max(WORKER_GRACEFUL_TIMEOUT, MICROSERVICE_DRAIN_DELAY + MICROSERVICE_DRAIN_TIMEOUT + 5)
+        WorkerPool(self._serve_worker, workers, graceful_timeout=graceful_timeout).run()
+
+    def _serve_worker(self, index: int):
+        """Serve requests in a forked worker process until it is told to exit."""
+        self.event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.event_loop)
+        sock = create_reuseport_socket(self.host_address, self.primary_port)
+        try:
+            self.event_loop.run_until_complete(self._serve_worker_async(sock))
+        finally:
+            dump_statistics()
+
+    async def _serve_worker_async(self, sock):
+        await self.initialize_server(sockets=[sock])
+        sync = asyncio.create_task(sync_statistics())
+        loop = asyncio.get_running_loop()
+        # the parent's request to drain, which the SIGINT or SIGTERM of the whole process group may have preceded
+        loop.add_signal_handler(WORKER_DRAIN_SIGNAL, self._start_drain)
+        try:
+            await self._serve()
+        finally:
+            loop.remove_signal_handler(WORKER_DRAIN_SIGNAL)
+            sync.cancel()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Drain the server, see `drain`, and free its event loop.
+
+        :param timeout: seconds the in-flight requests get to complete, MICROSERVICE_DRAIN_TIMEOUT by default.
+        """
+        self.event_loop.run_until_complete(self.drain(delay=0, timeout=timeout))
         self.event_loop.stop()
         self.event_loop.close()
         self.logger.close()
@@ -0,0 +1,104 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+import time
+from typing import Iterable, List, Optional
+
+from .logger import CustomLogger
+
+logger = CustomLogger("comps-core-load-balancer")
+
+
+class LoadBalancingPolicy:
+    """The client-side load balancing policies of a ReplicaPool."""
+
+    LEAST_OUTSTANDING = "least_outstanding"
+    POWER_OF_TWO = "p2c"
+
+
+LOAD_BALANCING_POLICIES = (LoadBalancingPolicy.LEAST_OUTSTANDING, LoadBalancingPolicy.POWER_OF_TWO)
+
+
+class Replica:
+    """One replica of a microservice and its client-side bookkeeping."""
+
+    __slots__ = ("base_url", "endpoint", "outstanding", "failures", "ejected_until")
+
+    def __init__(self, base_url: str, endpoint: str):
+        self.base_url = base_url
+        self.endpoint = endpoint
+        self.outstanding = 0  # requests currently in flight
+        self.failures = 0  # consecutive failures
+        self.ejected_until = 0.0  # monotonic time until which the replica is not picked
+
+    def is_healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def __repr__(self):
+        return f"Replica(endpoint={self.endpoint}, outstanding={self.outstanding}, failures={self.failures})"
+
+
+class ReplicaPool:
+    """Pick among the replicas of one service and eject the unhealthy ones.
+
+    Replicas are ejected passively after `max_failures` consecutive failed requests, for `eject_cooldown` seconds,
+    and actively by `mark_health` from a health checker. When every replica is ejected, the pool fails open and
+    keeps picking among all of them.
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        endpoint: str,
+        policy: str = LoadBalancingPolicy.POWER_OF_TWO,
+        max_failures: int = 3,
+        eject_cooldown: float = 30.0,
+    ):
+        if not base_urls:
+            raise ValueError("a replica pool needs at least one replica")
+        if policy not in LOAD_BALANCING_POLICIES:
+            raise ValueError(f"Unknown load balancing policy: {policy}")
+        self.replicas = [Replica(base_url, f"{base_url}{endpoint}") for base_url in base_urls]
+        self.policy = policy
+        self.max_failures = max_failures
+        self.eject_cooldown = eject_cooldown
+
+    def pick(self, exclude: Iterable[Replica] = ()) -> Replica:
+        """Choose the replica for the next request, avoiding `exclude` (e.g. for a hedged request) if possible."""
+        now = time.monotonic()
+        candidates = [r for r in self.replicas if r.is_healthy(now) and r not in exclude]
+        if not candidates:
+            candidates = [r for r in self.replicas if r.is_healthy(now)] or self.replicas
+
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.policy == LoadBalancingPolicy.POWER_OF_TWO:
+            candidates = random.sample(candidates, 2)
+        return min(candidates, key=lambda r: r.outstanding)
+
+    def acquire(self, exclude: Iterable[Replica] = ()) -> Replica:
+        replica = self.pick(exclude)
+        replica.outstanding += 1
+        return replica
+
+    def release(self, replica: Replica, success: Optional[bool]):
+        """Finish a request on the replica, `success` None means its outcome says nothing about the replica."""
+        replica.outstanding -= 1
+        if success is None:
+            return
+        if success:
+            replica.failures = 0
+            return
+        replica.failures += 1
+        if replica.failures >= self.max_failures and replica.is_healthy(time.monotonic()):
+            logger.warning(f"Ejecting {replica.endpoint} after {replica.failures} consecutive failures")
+            replica.ejected_until = time.monotonic() + self.eject_cooldown
+
+    def mark_health(self, replica: Replica, healthy: bool, ttl: Optional[float] = None):
+        """Record the result of an active health check, an unhealthy replica stays ejected for `ttl` seconds."""
+        if healthy:
+            replica.failures = 0
+            replica.ejected_until = 0.0
+        else:
+            replica.ejected_until = time.monotonic() + (self.eject_cooldown if ttl is None else ttl)
@@ -1,17 +1,19 @@
 # Copyright (C) 2024 Intel Corporation
 # SPDX-License-Identifier: Apache-2.0
 
-import asyncio
 import os
-from collections import defaultdict, deque
 from collections.abc import Callable
 from enum import Enum
 from typing import Any, List, Optional, Type, TypeAlias
 
 from ..proto.docarray import TextDoc
+from .admission import AdmissionController
+from .batching import DynamicBatcher
 from .constants import MCPFuncType, ServiceRoleType, ServiceType
 from .http_service import HTTPService
+from .load_balancer import LOAD_BALANCING_POLICIES, LoadBalancingPolicy
 from .logger import CustomLogger
+from .serialization import SERIALIZATION_FORMATS
 from .utils import check_ports_availability
 
 opea_microservices = {}
@@ -20,6 +22,9 @@ logger = CustomLogger("micro_service")
 logflag = os.getenv("LOGFLAG", False)
 AnyFunction: TypeAlias = Callable[..., Any]
 
+# service types whose requests can safely be retried or hedged
+IDEMPOTENT_SERVICE_TYPES = (ServiceType.EMBEDDING, ServiceType.RETRIEVER, ServiceType.RERANK)
+
 
 class MicroService(HTTPService):
     """MicroService class to create a microservice."""
@@ -43,13 +48,54 @@ class MicroService(HTTPService):
         use_remote_service: Optional[bool] = False,
         description: Optional[str] = None,
         dynamic_batching: bool = False,
-        dynamic_batching_timeout: int = 1,
+        dynamic_batching_timeout: float = 0.01,
         dynamic_batching_max_batch_size: int = 32,
+        dynamic_batching_max_concurrent_batches: int = 2,
+        dynamic_batching_func: AnyFunction = None,
         enable_mcp: bool = False,
         mcp_func_type: Enum = MCPFuncType.TOOL,
         func: AnyFunction = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        retry_backoff: float = 0.1,
+        hedge_delay: Optional[float] = None,
+        replicas: Optional[List[str]] = None,
+        load_balancing: str = LoadBalancingPolicy.POWER_OF_TWO,
+        coalesce_requests: bool = False,
+        cache_ttl: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        queue_timeout: float = 1.0,
+        adaptive_concurrency: bool = False,
+        serialization: str = "json",
     ):
-        """Init the microservice."""
+        """Init the microservice.
+
+        With `dynamic_batching`, handlers can pass requests to `dynamic_batching_submit`, they are merged into batches
+        of up to `dynamic_batching_max_batch_size` for `dynamic_batching_infer`, or `dynamic_batching_func` if given
+        (same signature). A batch is flushed when full or `dynamic_batching_timeout` seconds after its oldest request,
+        with up to `dynamic_batching_max_concurrent_batches` batches in flight.
+
+        `timeout`, `max_retries`, `retry_backoff` and `hedge_delay` are honored by a ServiceOrchestrator calling this
+        service: the total timeout of one attempt in seconds (None keeps the orchestrator default), how many times a
+        failed attempt is retried (None retries idempotent service types twice and others never), the base of the
+        jittered exponential backoff between attempts, and the delay after which a duplicate request is sent if the
+        first one has not answered yet (None disables hedging). Once enough latencies were observed, the hedge delay
+        follows their p95.
+
+        `replicas` lists further "host:port" or "protocol://host:port" addresses serving the same endpoint, the
+        orchestrator spreads requests over them and `host:port` with the `load_balancing` policy.
+
+        With `coalesce_requests`, concurrent identical requests from the orchestrator share one upstream call. With
+        `cache_ttl`, its successful replies are cached by the orchestrator for that many seconds, only set it for
+        services whose reply is deterministic for a given input.
+
+        `max_concurrency`, `max_queue_size`, `queue_timeout` and `adaptive_concurrency` enable admission control on
+        the service itself, see AdmissionController.
+
+        `serialization` is the body format the orchestrator talks to this service with, "json" or "msgpack" (embedding
+        vectors then travel as raw float32). Only pick "msgpack" for MicroService-based services, they accept both.
+        """
         self.service_role = service_role
         self.service_type = service_type
         self.protocol = protocol
@@ -65,6 +111,27 @@ class MicroService(HTTPService):
         self.dynamic_batching = dynamic_batching
         self.dynamic_batching_timeout = dynamic_batching_timeout
         self.dynamic_batching_max_batch_size = dynamic_batching_max_batch_size
+        self.dynamic_batching_max_concurrent_batches = dynamic_batching_max_concurrent_batches
+        self.batchers = {}  # service type -> DynamicBatcher
+        if dynamic_batching_func is not None:
+            self.dynamic_batching_infer = dynamic_batching_func
+        self.timeout = timeout
+        if max_retries is None:
+            max_retries = 2 if service_type in IDEMPOTENT_SERVICE_TYPES else 0
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.hedge_delay = hedge_delay
+        self.replicas = replicas or []
+        if load_balancing not in LOAD_BALANCING_POLICIES:
+            raise ValueError(
+                f"Unknown load balancing policy: {load_balancing}, expected one of {', '.join(LOAD_BALANCING_POLICIES)}"
+            )
+        self.load_balancing = load_balancing
+        self.coalesce_requests = coalesce_requests
+        self.cache_ttl = cache_ttl
+        if serialization not in SERIALIZATION_FORMATS:
+            raise ValueError(f"Unknown serialization: {serialization}")
+        self.serialization = serialization
         self.uvicorn_kwargs = {}
 
         if ssl_keyfile:
@@ -91,13 +158,21 @@ class MicroService(HTTPService):
                 "description": self.description or "OPEA Microservice Infrastructure",
             }
 
-            super().__init__(uvicorn_kwargs=self.uvicorn_kwargs, runtime_args=runtime_args)
-
-            # create a batch request processor loop if using dynamic batching
-            if self.dynamic_batching:
-                self.buffer_lock = asyncio.Lock()
-                self.request_buffer = defaultdict(deque)
-                self.add_startup_event(self._dynamic_batch_processor())
+            admission_controller = None
+            if max_concurrency:
+                admission_controller = AdmissionController(
+                    max_concurrency,
+                    max_queue_size=max_queue_size,
+                    queue_timeout=queue_timeout,
+                    adaptive=adaptive_concurrency,
+                    name=name,
+                )
+
+            super().__init__(
+                uvicorn_kwargs=self.uvicorn_kwargs,
+                runtime_args=runtime_args,
+                admission_controller=admission_controller,
+            )
 
             if not enable_mcp:
                 self._async_setup()
@@ -118,35 +193,37 @@ class MicroService(HTTPService):
         # overwrite name
         self.name = f"{name}/{self.__class__.__name__}" if name else self.__class__.__name__
 
-    async def _dynamic_batch_processor(self):
-        if logflag:
-            logger.info("dynamic batch processor looping...")
-        while True:
-            await asyncio.sleep(self.dynamic_batching_timeout)
-            runtime_batch: dict[Enum, list[dict]] = {}  # {ServiceType.Embedding: [{"request": xx, "response": yy}, {}]}
-
-            async with self.buffer_lock:
-                # prepare the runtime batch, access to buffer is locked
-                if self.request_buffer:
-                    for service_type, request_lst in self.request_buffer.items():
-                        batch = []
-                        # grab min(MAX_BATCH_SIZE, REQUEST_SIZE) requests from buffer
-                        for _ in range(min(self.dynamic_batching_max_batch_size, len(request_lst))):
-                            batch.append(request_lst.popleft())
-
-                        runtime_batch[service_type] = batch
-
-            # Run batched inference on the batch and set results
-            for service_type, batch in runtime_batch.items():
-                if not batch:
-                    continue
-                results = await self.dynamic_batching_infer(service_type, batch)
-
-                for req, result in zip(batch, results):
-                    req["response"].set_result(result)
+    async def dynamic_batching_submit(self, request: Any, service_type: Optional[Enum] = None) -> Any:
+        """Queue request for the next batch of its service type and wait for its result.
+
+        :param service_type: the batch queue to use, the service's own type by default.
+        """
+        if not self.dynamic_batching:
+            raise RuntimeError("Dynamic batching is not enabled on this microservice")
+        service_type = service_type or self.service_type
+        batcher = self.batchers.get(service_type)
+        if batcher is None:
+            batcher = DynamicBatcher(
+                lambda batch: self.dynamic_batching_infer(service_type, batch),
+                max_batch_size=self.dynamic_batching_max_batch_size,
+                timeout=self.dynamic_batching_timeout,
+                max_concurrent_batches=self.dynamic_batching_max_concurrent_batches,
+                name=self.name,
+            )
+            self.batchers[service_type] = batcher
+        return await batcher.submit(request)
+
+    async def terminate_server(self):
+        # the requests waiting on a batch were given their drain time by the server shutdown
+        await super().terminate_server()
+        for batcher in self.batchers.values():
+            await batcher.close()
 
     async def dynamic_batching_infer(self, service_type: Enum, batch: list[dict]):
-        """Need to implement."""
+        """Need to implement.
+
+        :param batch: [{"request": xx, "response": future}, ...], return one result per request, in order.
+        """
         raise NotImplementedError("Unimplemented dynamic batching inference!")
 
     def _validate_env(self):
@@ -163,14 +240,28 @@ class MicroService(HTTPService):
         else:
             return f"{self.protocol}://{self.host}:{self.port}{self.endpoint}"
 
-    def start(self):
-        """Start the server using MCP if enabled, otherwise fall back to default."""
+    def replica_urls(self) -> List[str]:
+        """Base URLs of all replicas of this service, host:port first."""
+        if self.api_key:
+            return [self.host]
+        urls = [f"{self.protocol}://{self.host}:{self.port}"]
+        for replica in self.replicas:
+            url = replica if "://" in replica else f"{self.protocol}://{replica}"
+            if url not in urls:
+                urls.append(url)
+        return urls
+
+    def start(self, workers: Optional[int] = None):
+        """Start the server using MCP if enabled, otherwise fall back to default.
+
+        :param workers: number of worker processes, MICROSERVICE_WORKERS by default, see HTTPService.start.
+        """
         if self.enable_mcp:
             self.mcp.run(
                 transport="sse",
             )
         else:
-            super().start()
+            super().start(workers)
 
     @property
     def api_key_value(self):
@@ -193,11 +284,26 @@ def register_microservice(
     provider_endpoint: Optional[str] = None,
     methods: List[str] = ["POST"],
     dynamic_batching: bool = False,
-    dynamic_batching_timeout: int = 1,
+    dynamic_batching_timeout: float = 0.01,
     dynamic_batching_max_batch_size: int = 32,
+    dynamic_batching_max_concurrent_batches: int = 2,
+    dynamic_batching_func: AnyFunction = None,
     enable_mcp: bool = False,
     description: str = None,
     mcp_func_type: Enum = MCPFuncType.TOOL,
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+    retry_backoff: float = 0.1,
+    hedge_delay: Optional[float] = None,
+    replicas: Optional[List[str]] = None,
+    load_balancing: str = LoadBalancingPolicy.POWER_OF_TWO,
+    coalesce_requests: bool = False,
+    cache_ttl: Optional[float] = None,
+    max_concurrency: Optional[int] = None,
+    max_queue_size: Optional[int] = None,
+    queue_timeout: float = 1.0,
+    adaptive_concurrency: bool = False,
+    serialization: str = "json",
 ):
     def decorator(func):
         if name not in opea_microservices:
@@ -218,10 +324,25 @@ def register_microservice(
                 dynamic_batching=dynamic_batching,
                 dynamic_batching_timeout=dynamic_batching_timeout,
                 dynamic_batching_max_batch_size=dynamic_batching_max_batch_size,
+                dynamic_batching_max_concurrent_batches=dynamic_batching_max_concurrent_batches,
+                dynamic_batching_func=dynamic_batching_func,
                 enable_mcp=enable_mcp,
                 func=func,
                 description=description,
                 mcp_func_type=mcp_func_type,
+                timeout=timeout,
+                max_retries=max_retries,
+                retry_backoff=retry_backoff,
+                hedge_delay=hedge_delay,
+                replicas=replicas,
+                load_balancing=load_balancing,
+                coalesce_requests=coalesce_requests,
+                cache_ttl=cache_ttl,
+                max_concurrency=max_concurrency,
+                max_queue_size=max_queue_size,
+                queue_timeout=queue_timeout,
+                adaptive_concurrency=adaptive_concurrency,
+                serialization=serialization,
             )
             opea_microservices[name] = micro_service
 
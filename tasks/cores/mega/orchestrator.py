@@ -2,83 +2,90 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import asyncio
+import codecs
 import contextlib
-import copy
-import json
 import os
+import random
 import re
-import threading
 import time
-from typing import Dict, List
+import weakref
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
 
 import aiohttp
-import requests
 from fastapi.responses import StreamingResponse
 from prometheus_client import Gauge, Histogram
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 
 from ..proto.docarray import LLMParams
 from ..telemetry.opea_telemetry import opea_telemetry, tracer
-from .constants import ServiceType
-from .dag import DAG
+from .constants import RequestPriority, ServiceType
+from .dag import DAG, RuntimeDAG
+from .load_balancer import ReplicaPool
 from .logger import CustomLogger
+from .response_cache import ResponseCache, create_response_cache
+from .scheduling import FairScheduler
+from .serialization import JSON, SERIALIZATION_FORMATS, content_type_of, dumps, loads
+from .single_flight import SingleFlight
+from .stream_metrics import StreamMeter
+from .utils import canonical_hash
 
 logger = CustomLogger("comps-core-orchestrator")
 LOGFLAG = os.getenv("LOGFLAG", False)
 ENABLE_OPEA_TELEMETRY = bool(os.environ.get("TELEMETRY_ENDPOINT"))
 
+# connection pool shared by all requests going through an orchestrator
+CONNECTION_LIMIT = int(os.getenv("ORCHESTRATOR_CONNECTION_LIMIT", 100))
+CONNECTION_LIMIT_PER_HOST = int(os.getenv("ORCHESTRATOR_CONNECTION_LIMIT_PER_HOST", 0))
+KEEPALIVE_TIMEOUT = float(os.getenv("ORCHESTRATOR_KEEPALIVE_TIMEOUT", 30))
+DNS_CACHE_TTL = int(os.getenv("ORCHESTRATOR_DNS_CACHE_TTL", 300))
+# sentences of a stream that may be in flight to its downstream node at the same time
+STREAM_PIPELINE_DEPTH = int(os.getenv("ORCHESTRATOR_STREAM_PIPELINE_DEPTH", 1))
+# default total timeout of one request to a microservice, overridden by MicroService.timeout
+REQUEST_TIMEOUT = float(os.getenv("ORCHESTRATOR_REQUEST_TIMEOUT", 2000))
+# statuses worth another attempt on an idempotent service
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# latencies kept per service to derive the hedge delay from, and how many are needed first
+HEDGE_LATENCY_WINDOW = 256
+HEDGE_MIN_SAMPLES = 20
+# replicas of a service are probed with /v1/health_check every interval seconds (0 disables active checks),
+# and passively ejected for a cooldown after consecutive failed requests
+HEALTH_CHECK_INTERVAL = float(os.getenv("ORCHESTRATOR_HEALTH_CHECK_INTERVAL", 10))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("ORCHESTRATOR_HEALTH_CHECK_TIMEOUT", 2))
+REPLICA_MAX_FAILURES = int(os.getenv("ORCHESTRATOR_REPLICA_MAX_FAILURES", 3))
+REPLICA_EJECT_COOLDOWN = float(os.getenv("ORCHESTRATOR_REPLICA_EJECT_COOLDOWN", 30))
+# max node calls in flight across all requests, beyond that they queue by priority and tenant; 0 disables
+DISPATCH_CONCURRENCY = int(os.getenv("ORCHESTRATOR_DISPATCH_CONCURRENCY", 0))
+# a node in a downstream_black_list is skipped for the whole request, not only on the edge from the node that
+# returned the list, so the in-flight branches feeding only it can be cancelled
+PRUNE_BLACK_LISTED_NODES = os.getenv("ORCHESTRATOR_PRUNE_BLACK_LISTED_NODES", "false").lower() == "true"
+
+# splits the sentences streamed back by downstream nodes into tokens
+_TOKEN_PATTERN = re.compile(r"\s?\S+\s?", re.UNICODE)
+
+# (priority, tenant) of the request being scheduled, inherited by its node tasks
+_dispatch_context = ContextVar("dispatch_context", default=(RequestPriority.NORMAL, None))
+
 
 class OrchestratorMetrics:
     def __init__(self) -> None:
-        # locking for latency metric creation / method change
-        self._lock = threading.Lock()
-
-        # Metrics related to token processing are created on demand,
-        # to avoid bogus ones for services that never handle tokens
-        self.first_token_latency = None
-        self.inter_token_latency = None
-        self.request_latency = None
-        self.request_pending = None
-
-        # initial methods to create the metrics
-        self.token_update = self._token_update_create
-        self.request_update = self._request_update_create
-        self.pending_update = self._pending_update_create
-
-    def _token_update_create(self, token_start: float, is_first: bool) -> float:
-        with self._lock:
-            # in case another thread already got here
-            if self.token_update == self._token_update_create:
-                self.first_token_latency = Histogram(
-                    "megaservice_first_token_latency", "First token latency (histogram)"
-                )
-                self.inter_token_latency = Histogram(
-                    "megaservice_inter_token_latency", "Inter-token latency (histogram)"
-                )
-                self.token_update = self._token_update_real
-        return self.token_update(token_start, is_first)
-
-    def _request_update_create(self, req_start: float) -> None:
-        with self._lock:
-            # in case another thread already got here
-            if self.request_update == self._request_update_create:
-                self.request_latency = Histogram(
-                    "megaservice_request_latency", "Whole LLM request/reply latency (histogram)"
-                )
-                self.request_update = self._request_update_real
-        self.request_update(req_start)
-
-    def _pending_update_create(self, increase: bool) -> None:
-        with self._lock:
-            # in case another thread already got here
-            if self.pending_update == self._pending_update_create:
-                self.request_pending = Gauge(
-                    "megaservice_request_pending", "Count of currently pending requests (gauge)"
-                )
-                self.pending_update = self._pending_update_real
-        self.pending_update(increase)
-
-    def _token_update_real(self, token_start: float, is_first: bool) -> float:
+        # created upfront, so the per-token path neither locks nor swaps methods
+        self.first_token_latency = Histogram("megaservice_first_token_latency", "First token latency (histogram)")
+        self.inter_token_latency = Histogram("megaservice_inter_token_latency", "Inter-token latency (histogram)")
+        self.request_latency = Histogram("megaservice_request_latency", "Whole LLM request/reply latency (histogram)")
+        self.request_pending = Gauge("megaservice_request_pending", "Count of currently pending requests (gauge)")
+        self.stream_meters = {}  # service name -> StreamMeter
+
+    def stream_meter(self, service: str) -> StreamMeter:
+        meter = self.stream_meters.get(service)
+        if meter is None:
+            meter = StreamMeter(service, self.first_token_latency, self.inter_token_latency)
+            self.stream_meters[service] = meter
+        return meter
+
+    def token_update(self, token_start: float, is_first: bool) -> float:
         now = time.monotonic()
         if is_first:
             self.first_token_latency.observe(now - token_start)
@@ -86,10 +93,10 @@ class OrchestratorMetrics:
             self.inter_token_latency.observe(now - token_start)
         return now
 
-    def _request_update_real(self, req_start: float) -> None:
+    def request_update(self, req_start: float) -> None:
         self.request_latency.observe(time.monotonic() - req_start)
 
-    def _pending_update_real(self, increase: bool) -> None:
+    def pending_update(self, increase: bool) -> None:
         if increase:
             self.request_pending.inc()
         else:
@@ -103,15 +110,49 @@ _metrics = OrchestratorMetrics()
 class ServiceOrchestrator(DAG):
     """Manage 1 or N micro services in a DAG through Python API."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        connection_limit: int = CONNECTION_LIMIT,
+        connection_limit_per_host: int = CONNECTION_LIMIT_PER_HOST,
+        keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = DNS_CACHE_TTL,
+        stream_pipeline_depth: int = STREAM_PIPELINE_DEPTH,
+        response_cache: Optional[ResponseCache] = None,
+        dispatch_concurrency: int = DISPATCH_CONCURRENCY,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        prune_black_listed_nodes: bool = PRUNE_BLACK_LISTED_NODES,
+    ) -> None:
         self.metrics = _metrics
         self.services = {}  # all services, id -> service
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.stream_pipeline_depth = max(1, stream_pipeline_depth)
+        self._session = None
+        self._session_loop = None
+        self._latencies = defaultdict(lambda: deque(maxlen=HEDGE_LATENCY_WINDOW))  # node -> recent latencies
+        self._replica_pools = {}  # node -> ReplicaPool, for services with several replicas
+        self._health_check_task = None
+        self._single_flight = SingleFlight()
+        self._response_cache = response_cache  # created on first use by a service with a cache_ttl
+        self._scheduler = FairScheduler(dispatch_concurrency, tenant_weights) if dispatch_concurrency > 0 else None
+        self.prune_black_listed_nodes = prune_black_listed_nodes
         super().__init__()
 
     def add(self, service):
         if service.name not in self.services:
             self.services[service.name] = service
             self.add_node_if_not_exists(service.name)
+            replica_urls = service.replica_urls()
+            if len(replica_urls) > 1:
+                self._replica_pools[service.name] = ReplicaPool(
+                    replica_urls,
+                    service.endpoint,
+                    policy=service.load_balancing,
+                    max_failures=REPLICA_MAX_FAILURES,
+                    eject_cooldown=REPLICA_EJECT_COOLDOWN,
+                )
         else:
             raise Exception(f"Service {service.name} already exists!")
         return self
@@ -124,77 +165,200 @@ class ServiceOrchestrator(DAG):
             logger.error(e)
             return False
 
+    async def startup(self):
+        """Create the shared connection pool, e.g. from a megaservice startup event."""
+        await self.get_session()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Return the long-lived client session, (re)creating it on the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._session_loop is not loop:
+            await self._close_foreign_session()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            # no await in between, so concurrent tasks on the same loop cannot create two pools
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, trust_env=True, timeout=timeout)
+            self._session_loop = loop
+            if self._replica_pools and HEALTH_CHECK_INTERVAL > 0:
+                if self._health_check_task is not None:
+                    self._health_check_task.cancel()
+                self._health_check_task = loop.create_task(self._health_check_loop())
+            if LOGFLAG:
+                logger.info(
+                    f"Created orchestrator connection pool: limit={self.connection_limit}, "
+                    f"limit_per_host={self.connection_limit_per_host}"
+                )
+        return self._session
+
+    async def _close_foreign_session(self):
+        """Close the session of another event loop, before one is created on the running loop."""
+        session, session_loop = self._session, self._session_loop
+        self._session = None
+        if session_loop.is_closed():
+            # its connections went with their loop, this only marks it closed
+            await session.close()
+        elif session_loop.is_running():
+            # serving in another thread, close it there
+            asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+        else:
+            self._session = session
+            raise RuntimeError(
+                "The orchestrator session belongs to another event loop that is still open, close() it there first"
+            )
+
+    async def close(self):
+        """Close the shared connection pool and the response cache."""
+        if self._response_cache is not None:
+            await self._response_cache.close()
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            session = await self.get_session()
+            await asyncio.gather(
+                *(
+                    self._check_replica(session, pool, replica)
+                    for pool in self._replica_pools.values()
+                    for replica in pool.replicas
+                )
+            )
+
+    async def _check_replica(self, session, pool: ReplicaPool, replica):
+        try:
+            async with session.get(
+                f"{replica.base_url}/v1/health_check", timeout=aiohttp.ClientTimeout(total=HEALTH_CHECK_TIMEOUT)
+            ) as response:
+                healthy = response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            healthy = False
+        if not healthy and replica.is_healthy(time.monotonic()):
+            logger.warning(f"Health check of {replica.base_url} failed, ejecting it")
+        pool.mark_health(replica, healthy)
+
     @opea_telemetry
-    async def schedule(self, initial_inputs: Dict | BaseModel, llm_parameters: LLMParams = LLMParams(), **kwargs):
+    async def schedule(
+        self,
+        initial_inputs: Dict | BaseModel,
+        llm_parameters: LLMParams = LLMParams(),
+        priority: RequestPriority = RequestPriority.NORMAL,
+        tenant: Optional[str] = None,
+        **kwargs,
+    ):
+        """Run the DAG on initial_inputs.
+
+        :param priority: the request's class when node calls queue for dispatch.
+        :param tenant: who node calls are accounted to when they queue, the inputs' `user` by default.
+        """
         req_start = time.monotonic()
         self.metrics.pending_update(True)
+        if tenant is None and isinstance(initial_inputs, dict):
+            tenant = initial_inputs.get("user")
+        elif tenant is None:
+            tenant = getattr(initial_inputs, "user", None)
+        _dispatch_context.set((priority, tenant))
 
         result_dict = {}
-        runtime_graph = DAG()
-        runtime_graph.graph = copy.deepcopy(self.graph)
+        plan = self.compile()
+        runtime_graph = RuntimeDAG(plan)
         if LOGFLAG:
             logger.info(initial_inputs)
 
-        timeout = aiohttp.ClientTimeout(total=2000)
-        async with aiohttp.ClientSession(trust_env=True, timeout=timeout) as session:
-            pending = {
-                asyncio.create_task(
-                    self.execute(session, req_start, node, initial_inputs, runtime_graph, llm_parameters, **kwargs)
-                )
-                for node in self.ind_nodes()
-            }
-            ind_nodes = self.ind_nodes()
-
-            while pending:
-                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
-                for done_task in done:
-                    response, node = await done_task
-                    result_dict[node] = response
-
-                    # traverse the current node's downstream nodes and execute if all one's predecessors are finished
-                    downstreams = runtime_graph.downstream(node)
-
-                    # remove all the black nodes that are skipped to be forwarded to
-                    if not isinstance(response, StreamingResponse) and "downstream_black_list" in response:
-                        for black_node in response["downstream_black_list"]:
-                            for downstream in reversed(downstreams):
-                                try:
-                                    if re.findall(black_node, downstream):
-                                        if LOGFLAG:
-                                            logger.info(f"skip forwardding to {downstream}...")
-                                        runtime_graph.delete_edge(node, downstream)
-                                        downstreams.remove(downstream)
-                                except re.error as e:
-                                    logger.error("Pattern invalid! Operation cancelled.")
-                            if len(downstreams) == 0 and llm_parameters.stream:
-                                # turn the response to a StreamingResponse
-                                # to make the response uniform to UI
-                                def fake_stream(text):
-                                    yield "data: b'" + text + "'\n\n"
-                                    yield "data: [DONE]\n\n"
-
-                                result_dict[node] = StreamingResponse(
-                                    fake_stream(response["text"]), media_type="text/event-stream"
-                                )
-
-                    for d_node in downstreams:
-                        if all(i in result_dict for i in runtime_graph.predecessors(d_node)):
-                            inputs = self.process_outputs(runtime_graph.predecessors(d_node), result_dict)
-                            pending.add(
-                                asyncio.create_task(
-                                    self.execute(
-                                        session, req_start, d_node, inputs, runtime_graph, llm_parameters, **kwargs
-                                    )
-                                )
+        session = await self.get_session()
+        scheduled = {}  # task -> node it was scheduled for
+        cancelled = set()  # tasks of pruned nodes
+        pruners = set()  # nodes that pruned some of their downstream nodes
+        for node in plan.ind_nodes:
+            task = asyncio.create_task(
+                self.execute(session, req_start, node, initial_inputs, runtime_graph, llm_parameters, **kwargs)
+            )
+            scheduled[task] = node
+        pending = set(scheduled)
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for done_task in done:
+                if done_task in cancelled:
+                    # pruned while finishing alongside the node that pruned it
+                    continue
+                response, node = await done_task
+                scheduled.pop(done_task)
+
+                result_dict[node] = response
+
+                # traverse the current node's downstream nodes and execute if all one's predecessors are finished
+                downstreams = runtime_graph.downstream(node)
+
+                # remove all the black nodes that are skipped to be forwarded to
+                skipped = []  # downstream nodes this node does not forward to
+                if not isinstance(response, StreamingResponse) and "downstream_black_list" in response:
+                    pruned = False
+                    for black_node in response["downstream_black_list"]:
+                        for downstream in reversed(downstreams):
+                            try:
+                                if re.findall(black_node, downstream):
+                                    if LOGFLAG:
+                                        logger.info(f"skip forwardding to {downstream}...")
+                                    runtime_graph.delete_edge(node, downstream)
+                                    downstreams.remove(downstream)
+                                    if runtime_graph.predecessors(downstream) and not self.prune_black_listed_nodes:
+                                        # still fed by its other predecessors, e.g. the other side of a join
+                                        skipped.append(downstream)
+                                    else:
+                                        # every predecessor skipped it, so is it for the whole request
+                                        runtime_graph.delete_node(downstream)
+                                    pruned = True
+                            except re.error as e:
+                                logger.error("Pattern invalid! Operation cancelled.")
+                        if len(downstreams) == 0 and llm_parameters.stream:
+                            # turn the response to a StreamingResponse
+                            # to make the response uniform to UI
+                            def fake_stream(text):
+                                yield "data: b'" + text + "'\n\n"
+                                yield "data: [DONE]\n\n"
+
+                            result_dict[node] = StreamingResponse(
+                                fake_stream(response["text"]), media_type="text/event-stream"
                             )
-        nodes_to_keep = []
-        for i in ind_nodes:
-            nodes_to_keep.append(i)
-            nodes_to_keep.extend(runtime_graph.all_downstreams(i))
-
-        all_nodes = list(runtime_graph.graph.keys())
-
-        for node in all_nodes:
+                    if pruned:
+                        pruners.add(node)
+                        for task in self.cancel_pruned(runtime_graph, pruners, scheduled):
+                            pending.discard(task)
+                            cancelled.add(task)
+                        downstreams = [d for d in downstreams if d not in runtime_graph.deleted_nodes]
+
+                # a skipped node runs on the outputs of its other predecessors, once they are all finished
+                skipped = [d for d in skipped if d not in runtime_graph.deleted_nodes]
+                for d_node in downstreams + skipped:
+                    if all(i in result_dict for i in runtime_graph.predecessors(d_node)):
+                        inputs = self.process_outputs(runtime_graph.predecessors(d_node), result_dict)
+                        task = asyncio.create_task(
+                            self.execute(session, req_start, d_node, inputs, runtime_graph, llm_parameters, **kwargs)
+                        )
+                        scheduled[task] = d_node
+                        pending.add(task)
+        if cancelled:
+            # let the aborted requests unwind, their connections are closed rather than reused
+            await asyncio.gather(*cancelled, return_exceptions=True)
+
+        # drop the nodes that are no longer reachable after pruning
+        ind_nodes = [node for node in plan.ind_nodes if node not in runtime_graph.deleted_nodes]
+        nodes_to_keep = set(ind_nodes)
+        for node in ind_nodes:
+            nodes_to_keep.update(runtime_graph.all_downstreams(node))
+        for node in plan.nodes:
             if node not in nodes_to_keep:
                 runtime_graph.delete_node_if_exists(node)
 
@@ -203,6 +367,32 @@ class ServiceOrchestrator(DAG):
 
         return result_dict, runtime_graph
 
+    def cancel_pruned(self, runtime_graph: RuntimeDAG, pruners, scheduled: Dict) -> List:
+        """Cancel the in-flight nodes whose output can no longer reach any output of the graph, and drop them.
+
+        :param pruners: the nodes that pruned downstream nodes, they become outputs when nothing useful is left below.
+        :return: the cancelled tasks.
+        """
+        useful = runtime_graph.all_upstreams(
+            node for node in runtime_graph.plan.nodes if not runtime_graph.plan.successors[node]
+        )
+        for node in runtime_graph.topological_sort():
+            if node in pruners and not any(d in useful for d in runtime_graph.downstream(node)):
+                useful |= runtime_graph.all_upstreams([node])
+
+        tasks = []
+        for task, node in list(scheduled.items()):
+            if node not in useful:
+                if LOGFLAG:
+                    logger.info(f"cancel {node}, its output is no longer needed...")
+                task.cancel()
+                del scheduled[task]
+                tasks.append(task)
+        for node in runtime_graph.topological_sort():
+            if node not in useful:
+                runtime_graph.delete_node(node)
+        return tasks
+
     def process_outputs(self, prev_nodes: List, result_dict: Dict) -> Dict:
         all_outputs = {}
 
@@ -211,9 +401,10 @@ class ServiceOrchestrator(DAG):
             all_outputs.update(result_dict[prev_node])
         return all_outputs
 
-    def wrap_iterable(self, iterable, is_first=True):
+    async def wrap_iterable(self, iterable, is_first=True):
 
         with tracer.start_as_current_span("llm_generate_stream") if ENABLE_OPEA_TELEMETRY else contextlib.nullcontext():
+            iterator = iterable.__aiter__()
             while True:
                 with (
                     tracer.start_as_current_span("llm_generate_stream_first_token")
@@ -221,14 +412,12 @@ class ServiceOrchestrator(DAG):
                     else contextlib.nullcontext()
                 ):  #  else tracer.start_as_current_span(f"llm_generate_stream_next_token")
                     try:
-                        token = next(iterable)
-                        yield token
-                        is_first = False
-                    except StopIteration:
+                        token = await iterator.__anext__()
+                    except StopAsyncIteration:
                         # Exiting the iterable loop cleanly
                         break
-                    except Exception as e:
-                        raise e
+                    yield token
+                    is_first = False
 
     @opea_telemetry
     async def execute(
@@ -259,100 +448,158 @@ class ServiceOrchestrator(DAG):
         else:
             endpoint = self.services[cur_node].endpoint_path(None)
         if is_llm_vlm and llm_parameters.stream:
-            # Still leave to sync requests.post for StreamingResponse
             if LOGFLAG:
                 logger.info(inputs)
-            with (
-                tracer.start_as_current_span(f"{cur_node}_asyn_generate")
-                if ENABLE_OPEA_TELEMETRY
-                else contextlib.nullcontext()
-            ):
-                if access_token:
-                    response = requests.post(
-                        url=endpoint,
-                        data=json.dumps(inputs),
-                        headers={"Content-type": "application/json", "Authorization": f"Bearer {access_token}"},
-                        proxies={"http": None},
-                        stream=True,
-                        timeout=2000,
+            headers = {"Content-type": "application/json"}
+            if access_token:
+                headers["Authorization"] = f"Bearer {access_token}"
+            await self.acquire_dispatch()
+            pool = self._replica_pools.get(cur_node)
+            replica = pool.acquire() if pool is not None else None
+            if replica is not None:
+                endpoint = replica.endpoint
+            try:
+                with (
+                    tracer.start_as_current_span(f"{cur_node}_asyn_generate")
+                    if ENABLE_OPEA_TELEMETRY
+                    else contextlib.nullcontext()
+                ):
+                    # a stream may legitimately outlive the service's total timeout, bound the reads instead
+                    response = await session.post(
+                        endpoint,
+                        data=dumps(inputs),
+                        headers=headers,
+                        timeout=aiohttp.ClientTimeout(
+                            total=None, sock_read=self.services[cur_node].timeout or REQUEST_TIMEOUT
+                        ),
                     )
-
+            except BaseException:
+                if replica is not None:
+                    pool.release(replica, False)
+                self.release_dispatch()
+                raise
+
+            released = False
+
+            def release():
+                # hand the connection, the replica and the dispatch slot back once, at the end of the stream, or
+                # when it never starts: an error before it is returned, a client gone before the body is sent
+                nonlocal released
+                if released:
+                    return
+                released = True
+                response.release()
+                if replica is not None:
+                    pool.release(replica, response.status < 500)
+                self.release_dispatch()
+
+            async def release_in_background():
+                # an async background task, Starlette runs sync ones in a thread
+                release()
+
+            try:
+                meter = self.metrics.stream_meter(cur_node)
+                downstream = runtime_graph.downstream(cur_node)
+                if downstream:
+                    assert len(downstream) == 1, "Not supported multiple stream downstreams yet!"
+                    cur_node = downstream[0]
+                    hitted_ends = [".", "?", "!", "。", "，", "！"]
+                    downstream_endpoint = self.services[downstream[0]].endpoint_path()
+            except BaseException:
+                release()
+                raise
+
+            async def post_sentence(text):
+                async with session.post(
+                    downstream_endpoint,
+                    data=dumps({"text": text}),
+                    headers=headers,
+                    **self._timeout_kwargs(downstream[0]),
+                ) as res:
+                    res_json = loads(await res.read())
+                if "text" in res_json:
+                    return res_json["text"]
                 else:
-                    response = requests.post(
-                        url=endpoint,
-                        data=json.dumps(inputs),
-                        headers={
-                            "Content-type": "application/json",
-                        },
-                        proxies={"http": None},
-                        stream=True,
-                        timeout=2000,
-                    )
+                    raise Exception("Other response types not supported yet!")
 
-            downstream = runtime_graph.downstream(cur_node)
-            if downstream:
-                assert len(downstream) == 1, "Not supported multiple stream downstreams yet!"
-                cur_node = downstream[0]
-                hitted_ends = [".", "?", "!", "。", "，", "！"]
-                downstream_endpoint = self.services[downstream[0]].endpoint_path()
-
-            def generate():
-                token_start = req_start
-                if response:
-                    # response.elapsed = time until first headers received
+            async def pipe_sentences(queue, in_flight):
+                # keep reading the upstream stream while downstream nodes work on earlier sentences
+                try:
                     buffered_chunk_str = ""
-                    is_first = True
-                    for chunk in self.wrap_iterable(response.iter_content(chunk_size=None)):
+                    # chunks may split multi-byte characters
+                    decoder = codecs.getincrementaldecoder("utf-8")()
+                    async for chunk in self.wrap_iterable(response.content.iter_any()):
                         if chunk:
-                            if downstream:
-                                chunk = chunk.decode("utf-8")
-                                buffered_chunk_str += self.extract_chunk_str(chunk)
-                                is_last = chunk.endswith("[DONE]\n\n")
-                                if (buffered_chunk_str and buffered_chunk_str[-1] in hitted_ends) or is_last:
-                                    if access_token:
-                                        res = requests.post(
-                                            url=downstream_endpoint,
-                                            data=json.dumps({"text": buffered_chunk_str}),
-                                            headers={
-                                                "Content-type": "application/json",
-                                                "Authorization": f"Bearer {access_token}",
-                                            },
-                                            proxies={"http": None},
-                                            timeout=2000,
-                                        )
-                                    else:
-                                        res = requests.post(
-                                            url=downstream_endpoint,
-                                            data=json.dumps({"text": buffered_chunk_str}),
-                                            headers={
-                                                "Content-type": "application/json",
-                                            },
-                                            proxies={"http": None},
-                                            timeout=2000,
-                                        )
-                                    res_json = res.json()
-                                    if "text" in res_json:
-                                        res_txt = res_json["text"]
-                                    else:
-                                        raise Exception("Other response types not supported yet!")
-                                    buffered_chunk_str = ""  # clear
-                                    yield from self.token_generator(
-                                        res_txt, token_start, is_first=is_first, is_last=is_last
-                                    )
+                            chunk = decoder.decode(chunk)
+                            buffered_chunk_str += self.extract_chunk_str(chunk)
+                            is_last = chunk.endswith("[DONE]\n\n")
+                            if (buffered_chunk_str and buffered_chunk_str[-1] in hitted_ends) or is_last:
+                                await in_flight.acquire()
+                                await queue.put((asyncio.create_task(post_sentence(buffered_chunk_str)), is_last))
+                                buffered_chunk_str = ""  # clear
+                except Exception as e:
+                    await queue.put(e)
+                else:
+                    await queue.put(None)
+
+            async def generate():
+                token_start = req_start
+                try:
+                    if response.ok:
+                        is_first = True
+                        if downstream:
+                            queue = asyncio.Queue()
+                            in_flight = asyncio.Semaphore(self.stream_pipeline_depth)
+                            reader = asyncio.create_task(pipe_sentences(queue, in_flight))
+                            try:
+                                while (item := await queue.get()) is not None:
+                                    if isinstance(item, Exception):
+                                        raise item
+                                    sentence_task, is_last = item
+                                    try:
+                                        # emit in sentence order, whatever order the replies arrive in
+                                        res_txt = await sentence_task
+                                    finally:
+                                        in_flight.release()
+                                    for token in self.token_generator(
+                                        res_txt, token_start, is_first=is_first, is_last=is_last, service=meter.service
+                                    ):
+                                        yield token
                                     token_start = time.monotonic()
                                     is_first = False
-                            else:
-                                token_start = self.metrics.token_update(token_start, is_first)
-                                is_first = False
-                                yield chunk
-
-                    self.metrics.request_update(req_start)
-                    self.metrics.pending_update(False)
-
-            return (
-                StreamingResponse(self.align_generator(generate(), **kwargs), media_type="text/event-stream"),
-                cur_node,
-            )
+                            finally:
+                                reader.cancel()
+                                while not queue.empty():
+                                    item = queue.get_nowait()
+                                    if isinstance(item, tuple):
+                                        item[0].cancel()
+                        else:
+                            async for chunk in self.wrap_iterable(response.content.iter_any()):
+                                if chunk:
+                                    token_start = meter.token(token_start, is_first, len(chunk))
+                                    is_first = False
+                                    yield chunk
+
+                        meter.flush()
+                        self.metrics.request_update(req_start)
+                        self.metrics.pending_update(False)
+                finally:
+                    # hand the connection back to the pool, also when the client disconnects mid-stream
+                    release()
+
+            try:
+                stream = generate()
+                # a stream dropped without ever being iterated does not run its finally block
+                weakref.finalize(stream, release)
+                streaming_response = StreamingResponse(
+                    self.align_generator(stream, **kwargs),
+                    media_type="text/event-stream",
+                    background=BackgroundTask(release_in_background),
+                )
+            except BaseException:
+                release()
+                raise
+            return streaming_response, cur_node
         else:
             if LOGFLAG:
                 logger.info(inputs)
@@ -368,23 +615,181 @@ class ServiceOrchestrator(DAG):
                 if ENABLE_OPEA_TELEMETRY
                 else contextlib.nullcontext()
             ):
-                response = await session.post(
-                    endpoint,
-                    json=input_data,
-                    headers={"Content-type": "application/json", "Authorization": f"Bearer {access_token}"},
-                )
+                content_type = SERIALIZATION_FORMATS[self.services[cur_node].serialization]
+                headers = {"Content-type": content_type, "Authorization": f"Bearer {access_token}"}
+                if content_type != JSON:
+                    headers["Accept"] = f"{content_type}, {JSON}"
+                data = await self.request(session, cur_node, endpoint, input_data, headers)
 
-            if response.content_type == "audio/wav":
-                audio_data = await response.read()
-                data = self.align_outputs(audio_data, cur_node, inputs, runtime_graph, llm_parameters_dict, **kwargs)
-            else:
-                # Parse as JSON
-                data = await response.json()
-                # post process
-                data = self.align_outputs(data, cur_node, inputs, runtime_graph, llm_parameters_dict, **kwargs)
+            # post process
+            data = self.align_outputs(data, cur_node, inputs, runtime_graph, llm_parameters_dict, **kwargs)
 
             return data, cur_node
 
+    async def request(self, session, cur_node: str, endpoint: str, input_data: Dict, headers: Dict):
+        """Get the node's reply for input_data from the response cache, or from the node itself."""
+        service = self.services[cur_node]
+        key = None
+        if service.cache_ttl or service.coalesce_requests:
+            key = f"{cur_node}:{endpoint}:{canonical_hash(input_data)}"
+
+        if service.cache_ttl:
+            if self._response_cache is None:
+                self._response_cache = create_response_cache()
+            data = await self._response_cache.lookup(cur_node, key)
+            if data is not None:
+                return data
+
+        if service.coalesce_requests:
+            # identical concurrent calls to the node share one upstream request
+            data, status = await self._single_flight.do(
+                key, lambda: self.dispatch(session, cur_node, endpoint, input_data, headers)
+            )
+        else:
+            data, status = await self.dispatch(session, cur_node, endpoint, input_data, headers)
+
+        if service.cache_ttl and 200 <= status < 300:
+            await self._response_cache.store(key, data, service.cache_ttl)
+        return data
+
+    async def acquire_dispatch(self):
+        """Wait for the turn of the current request to call a node, when dispatch concurrency is bounded."""
+        if self._scheduler is not None:
+            await self._scheduler.acquire(*_dispatch_context.get())
+
+    def release_dispatch(self):
+        if self._scheduler is not None:
+            self._scheduler.release()
+
+    async def dispatch(self, session, cur_node: str, endpoint: str, input_data: Dict, headers: Dict):
+        await self.acquire_dispatch()
+        try:
+            return await self.request_with_retries(session, cur_node, endpoint, input_data, headers)
+        finally:
+            self.release_dispatch()
+
+    def _timeout_kwargs(self, cur_node: str) -> Dict:
+        timeout = self.services[cur_node].timeout
+        return {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+
+    async def _post(
+        self,
+        session,
+        cur_node: str,
+        endpoint: str,
+        input_data: Dict,
+        headers: Dict,
+        retryable: bool,
+        attempted: Optional[List] = None,
+    ):
+        """Send one attempt and read the whole reply, so the timeout covers the body too.
+
+        For a service with several replicas, the endpoint is replaced by the one of the replica picked by its pool,
+        avoiding the replicas already in `attempted` if possible.
+        """
+        pool = self._replica_pools.get(cur_node)
+        replica = None
+        if pool is not None:
+            replica = pool.acquire(exclude=attempted or ())
+            endpoint = replica.endpoint
+            if attempted is not None:
+                attempted.append(replica)
+
+        healthy = False
+        try:
+            start = time.monotonic()
+            body = dumps(input_data, content_type_of(headers.get("Content-type")))
+            async with session.post(endpoint, data=body, headers=headers, **self._timeout_kwargs(cur_node)) as response:
+                if retryable and response.status in RETRYABLE_STATUSES:
+                    response.raise_for_status()
+                if response.content_type == "audio/wav":
+                    data = await response.read()
+                else:
+                    # JSON, or msgpack if the service answered in it
+                    data = loads(await response.read(), response.content_type)
+                healthy = response.status < 500
+            self._latencies[cur_node].append(time.monotonic() - start)
+            return data, response.status
+        except asyncio.CancelledError:
+            # e.g. the losing half of a hedged request, which says nothing about the replica health
+            healthy = None
+            raise
+        finally:
+            if replica is not None:
+                pool.release(replica, healthy)
+
+    def hedge_delay(self, cur_node: str) -> Optional[float]:
+        """Delay before a duplicate request is sent to the node, the p95 of its recent latencies once known."""
+        hedge_delay = self.services[cur_node].hedge_delay
+        if hedge_delay is None:
+            return None
+        latencies = self._latencies[cur_node]
+        if len(latencies) >= HEDGE_MIN_SAMPLES:
+            latencies = sorted(latencies)
+            return latencies[int(0.95 * (len(latencies) - 1))]
+        return hedge_delay
+
+    async def _post_hedged(
+        self, session, cur_node: str, endpoint: str, input_data: Dict, headers: Dict, retryable: bool, attempted: List
+    ):
+        delay = self.hedge_delay(cur_node)
+        first = asyncio.create_task(self._post(session, cur_node, endpoint, input_data, headers, retryable, attempted))
+        if delay is None:
+            return await first
+
+        pending = {first}
+        failed = []
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+            if LOGFLAG:
+                logger.info(f"{cur_node} did not answer within {delay:.3f}s, hedging the request")
+            # with replicas, the duplicate goes to another replica than the first attempt
+            second = asyncio.create_task(
+                self._post(session, cur_node, endpoint, input_data, headers, retryable, attempted)
+            )
+            pending.add(second)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # the first successful reply wins, even when both attempts finished together, an error only counts
+                # once both attempts failed
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    failed.append(task)
+            return failed[0].result()
+        finally:
+            # asyncio.wait does not cancel what it waits on, the attempts left would outlive a cancelled caller
+            for task in pending:
+                task.cancel()
+
+    async def request_with_retries(self, session, cur_node: str, endpoint: str, input_data: Dict, headers: Dict):
+        """Post input_data to the node, honoring its timeout, retry and hedging settings.
+
+        :return: the reply, parsed unless it is audio, and its HTTP status.
+        """
+        service = self.services[cur_node]
+        attempted = []  # replicas already tried, retries prefer other ones
+        for attempt in range(service.max_retries + 1):
+            try:
+                # a retryable status of the last attempt is returned as is, like any other reply
+                return await self._post_hedged(
+                    session,
+                    cur_node,
+                    endpoint,
+                    input_data,
+                    headers,
+                    retryable=attempt < service.max_retries,
+                    attempted=attempted,
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == service.max_retries:
+                    raise
+                backoff = service.retry_backoff * (2**attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"Request to {cur_node} failed ({e!r}), retrying in {backoff:.3f}s")
+                await asyncio.sleep(backoff)
+
     def align_inputs(self, inputs, *args, **kwargs):
         """Override this method in megaservice definition."""
         return inputs
@@ -394,7 +799,10 @@ class ServiceOrchestrator(DAG):
         return data
 
     def align_generator(self, gen, *args, **kwargs):
-        """Override this method in megaservice definition."""
+        """Override this method in megaservice definition.
+
+        `gen` is an async generator, overrides should iterate it with `async for`.
+        """
         return gen
 
     def get_all_final_outputs(self, result_dict, runtime_graph):
@@ -416,13 +824,17 @@ class ServiceOrchestrator(DAG):
             chunk_str = chunk_str[: -len(suffix)]
         return chunk_str
 
-    def token_generator(self, sentence: str, token_start: float, is_first: bool, is_last: bool) -> str:
-        prefix = "data: "
-        suffix = "\n\n"
-        tokens = re.findall(r"\s?\S+\s?", sentence, re.UNICODE)
-        for token in tokens:
-            token_start = self.metrics.token_update(token_start, is_first)
-            yield prefix + repr(token.replace("\\n", "\n").encode("utf-8")) + suffix
+    def token_generator(
+        self, sentence: str, token_start: float, is_first: bool, is_last: bool, service: Optional[str] = None
+    ) -> str:
+        """Yield the SSE events of the tokens of sentence, recorded in the stream metrics of service."""
+        meter = self.metrics.stream_meter(service or "")
+        for token in _TOKEN_PATTERN.findall(sentence):
+            if "\\" in token:
+                token = token.replace("\\n", "\n")
+            data = token.encode()
+            token_start = meter.token(token_start, is_first, len(data))
+            yield f"data: {data!r}\n\n"
             is_first = False
         if is_last:
             yield "data: [DONE]\n\n"
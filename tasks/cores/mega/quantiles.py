@@ -0,0 +1,181 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import math
+import time
+from typing import Dict, Iterable, List, Optional
+
+# sliding windows reported next to the all-time statistics, name -> seconds
+WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+# windows up to FINE_HORIZON seconds are summed from FINE_SLOT slots, longer ones from COARSE_SLOT slots
+FINE_SLOT = 10
+FINE_HORIZON = 300
+COARSE_SLOT = 60
+COARSE_HORIZON = 3600
+
+
+class QuantileSketch:
+    """DDSketch of non-negative values: quantiles within `relative_accuracy` of the exact ones, in bounded memory.
+
+    Values fall in logarithmic buckets, the count of each is all that is kept. Sketches with the same accuracy merge
+    exactly by adding their counts. Beyond `max_buckets`, the lowest buckets are collapsed, which only degrades the
+    lowest quantiles; at 1% accuracy, 2048 buckets span more than 17 orders of magnitude.
+    """
+
+    __slots__ = ("relative_accuracy", "max_buckets", "gamma", "_log_gamma", "buckets", "zero_count", "count", "sum")
+
+    # values below are counted as 0
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}  # index -> count of the values in (gamma^(index-1), gamma^index]
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value: float):
+        if value > self.MIN_VALUE:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+            if len(self.buckets) > self.max_buckets:
+                self._collapse()
+        else:
+            self.zero_count += 1
+        self.count += 1
+        self.sum += value
+
+    def _collapse(self):
+        indexes = sorted(self.buckets)
+        excess = len(indexes) - self.max_buckets
+        if excess <= 0:
+            return
+        moved = sum(self.buckets.pop(index) for index in indexes[:excess])
+        self.buckets[indexes[excess]] += moved
+
+    def merge(self, other: "QuantileSketch"):
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self._collapse()
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        """Return the q-quantile, 0 <= q <= 1, for each of qs, None when the sketch is empty."""
+        qs = list(qs)
+        if not self.count:
+            return [None] * len(qs)
+        results = [None] * len(qs)
+        pending = sorted(range(len(qs)), key=lambda i: qs[i])
+        indexes = sorted(self.buckets)
+        position = 0
+        seen = self.zero_count
+        for i in pending:
+            rank = qs[i] * (self.count - 1)
+            if rank < self.zero_count:
+                results[i] = 0.0
+                continue
+            while position < len(indexes) - 1 and seen + self.buckets[indexes[position]] <= rank:
+                seen += self.buckets[indexes[position]]
+                position += 1
+            results[i] = 2 * self.gamma ** indexes[position] / (self.gamma + 1)
+        return results
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+
+    @property
+    def average(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": list(self.buckets.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.buckets = {int(index): count for index, count in data["buckets"]}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        return sketch
+
+
+class WindowedQuantiles:
+    """Quantile sketches of all the values added, and of those of the last minute, 5 minutes and hour.
+
+    Recent values are also added to the sketch of their time slot, slots are keyed on wall-clock time so that the
+    windows of several processes line up when merged. A window sums the slots it overlaps, the oldest one may be
+    partially outside of it.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.total = QuantileSketch(relative_accuracy)
+        self.fine: Dict[int, QuantileSketch] = {}  # slot index -> sketch
+        self.coarse: Dict[int, QuantileSketch] = {}
+
+    def _slot(self, slots: Dict[int, QuantileSketch], index: int, keep: int) -> QuantileSketch:
+        sketch = slots.get(index)
+        if sketch is None:
+            sketch = slots[index] = QuantileSketch(self.relative_accuracy)
+            for old in [old for old in slots if old <= index - keep]:
+                del slots[old]
+        return sketch
+
+    def add(self, value: float, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self.total.add(value)
+        self._slot(self.fine, int(now // FINE_SLOT), FINE_HORIZON // FINE_SLOT).add(value)
+        self._slot(self.coarse, int(now // COARSE_SLOT), COARSE_HORIZON // COARSE_SLOT).add(value)
+
+    def window(self, seconds: float, now: Optional[float] = None) -> QuantileSketch:
+        """Return a sketch of the values added in the last seconds."""
+        now = time.time() if now is None else now
+        slot, slots = (FINE_SLOT, self.fine) if seconds <= FINE_HORIZON else (COARSE_SLOT, self.coarse)
+        current = int(now // slot)
+        first = current - math.ceil(seconds / slot) + 1
+        sketch = QuantileSketch(self.relative_accuracy)
+        for index, slot_sketch in slots.items():
+            if first <= index <= current:
+                sketch.merge(slot_sketch)
+        return sketch
+
+    def merge(self, other: "WindowedQuantiles"):
+        self.total.merge(other.total)
+        for slots, other_slots in ((self.fine, other.fine), (self.coarse, other.coarse)):
+            for index, sketch in other_slots.items():
+                if index in slots:
+                    slots[index].merge(sketch)
+                else:
+                    slots[index] = QuantileSketch.from_dict(sketch.to_dict())
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total.to_dict(),
+            "fine": [(index, sketch.to_dict()) for index, sketch in self.fine.items()],
+            "coarse": [(index, sketch.to_dict()) for index, sketch in self.coarse.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WindowedQuantiles":
+        windowed = cls()
+        windowed.total = QuantileSketch.from_dict(data["total"])
+        windowed.relative_accuracy = windowed.total.relative_accuracy
+        windowed.fine = {int(index): QuantileSketch.from_dict(sketch) for index, sketch in data["fine"]}
+        windowed.coarse = {int(index): QuantileSketch.from_dict(sketch) for index, sketch in data["coarse"]}
+        return windowed
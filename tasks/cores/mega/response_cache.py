@@ -0,0 +1,156 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import abc
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import orjson
+from prometheus_client import Counter
+
+from .logger import CustomLogger
+
+logger = CustomLogger("comps-core-response-cache")
+
+cache_hits = Counter("megaservice_response_cache_hits", "Node replies served from the response cache", ["service"])
+cache_misses = Counter("megaservice_response_cache_misses", "Node replies not found in the response cache", ["service"])
+
+
+def _encode(value: Any) -> bytes:
+    # audio replies are raw bytes, everything else is JSON
+    if isinstance(value, bytes):
+        return b"b" + value
+    return b"j" + orjson.dumps(value)
+
+
+def _decode(payload: bytes) -> Any:
+    if payload[:1] == b"b":
+        return payload[1:]
+    return orjson.loads(payload[1:])
+
+
+class ResponseCache(abc.ABC):
+    """Cache of microservice replies, keyed on the node and its canonicalized input.
+
+    Values are stored serialized, so every hit returns a fresh object the caller may mutate.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the serialized value stored for key, None on a miss."""
+        ...
+
+    @abc.abstractmethod
+    async def set(self, key: str, payload: bytes, ttl: float):
+        """Store the serialized value for key for ttl seconds."""
+        ...
+
+    async def lookup(self, service: str, key: str) -> Optional[Any]:
+        payload = await self.get(key)
+        if payload is None:
+            cache_misses.labels(service=service).inc()
+            return None
+        cache_hits.labels(service=service).inc()
+        return _decode(payload)
+
+    async def store(self, key: str, value: Any, ttl: float):
+        try:
+            payload = _encode(value)
+        except TypeError as e:
+            logger.warning(f"Reply for {key} is not cacheable: {e}")
+            return
+        await self.set(key, payload, ttl)
+
+    async def close(self):
+        pass
+
+
+class LRUResponseCache(ResponseCache):
+    """In-process cache evicting the least recently used entries beyond max_bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    async def set(self, key: str, payload: bytes, ttl: float):
+        if len(payload) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._pop(key)
+        self._entries[key] = (time.monotonic() + ttl, payload)
+        self.size += len(payload)
+        while self.size > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str):
+        _, payload = self._entries.pop(key)
+        self.size -= len(payload)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisResponseCache(ResponseCache):
+    """Cache shared by all orchestrator replicas, on the Redis configured like RedisDBStore (REDIS_URL).
+
+    The store's client decodes replies as UTF-8 strings, payloads go through latin-1 to keep their exact bytes.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: str = "opea:response_cache:"):
+        from ..storages.redisdb import RedisDBStore
+
+        self.prefix = prefix
+        self.store = RedisDBStore(
+            "redis",
+            "OPEA response cache",
+            config={"REDIS_URL": redis_url or os.getenv("REDIS_URL", RedisDBStore.DEFAULT_REDIS_URL)},
+        )
+
+    async def _client(self):
+        await self.store._ensure_async_initialized()
+        return self.store.client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            client = await self._client()
+            payload = await client.get(self.prefix + key)
+        except Exception as e:
+            # a cache outage must not fail the request
+            logger.error(f"Response cache lookup failed: {e}")
+            return None
+        return payload.encode("latin-1") if isinstance(payload, str) else payload
+
+    async def set(self, key: str, payload: bytes, ttl: float):
+        try:
+            client = await self._client()
+            await client.set(self.prefix + key, payload.decode("latin-1"), px=max(1, int(ttl * 1000)))
+        except Exception as e:
+            logger.error(f"Response cache update failed: {e}")
+
+    async def close(self):
+        await self.store.close()
+
+
+def create_response_cache(backend: Optional[str] = None) -> ResponseCache:
+    """Create the response cache selected by `backend` or ORCHESTRATOR_RESPONSE_CACHE ("memory" or "redis")."""
+    backend = (backend or os.getenv("ORCHESTRATOR_RESPONSE_CACHE", "memory")).lower()
+    if backend == "memory":
+        return LRUResponseCache(int(os.getenv("ORCHESTRATOR_RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)))
+    elif backend == "redis":
+        return RedisResponseCache()
+    else:
+        raise ValueError(f"Unknown response cache backend: {backend}")
@@ -0,0 +1,122 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Hashable, Optional
+
+from prometheus_client import Gauge, Histogram
+
+from .constants import RequestPriority
+
+dispatch_queue_depth = Gauge(
+    "megaservice_dispatch_queue_depth", "Node calls waiting for dispatch per priority class (gauge)", ["priority"]
+)
+dispatch_wait = Histogram(
+    "megaservice_dispatch_wait_seconds", "Time node calls waited for dispatch per priority class", ["priority"]
+)
+
+
+class _TenantQueues:
+    """Waiters of one priority class, served across tenants by deficit round robin."""
+
+    def __init__(self, weights: Dict[Hashable, float]):
+        self.weights = weights
+        self.tenants = OrderedDict()  # tenant -> deque of waiters, in round robin order
+        self.deficits = {}
+
+    def __len__(self):
+        return sum(len(waiters) for waiters in self.tenants.values())
+
+    def push(self, tenant: Hashable, waiter: asyncio.Future):
+        if tenant not in self.tenants:
+            self.tenants[tenant] = deque()
+            self.deficits[tenant] = 0.0
+        self.tenants[tenant].append(waiter)
+
+    def remove(self, tenant: Hashable, waiter: asyncio.Future):
+        waiters = self.tenants[tenant]
+        waiters.remove(waiter)
+        if not waiters:
+            del self.tenants[tenant]
+            del self.deficits[tenant]
+
+    def pop(self) -> asyncio.Future:
+        while True:
+            tenant, waiters = next(iter(self.tenants.items()))
+            if self.deficits[tenant] < 1:
+                self.deficits[tenant] += self.weights.get(tenant, 1.0)
+                if self.deficits[tenant] < 1:
+                    self.tenants.move_to_end(tenant)
+                    continue
+            self.deficits[tenant] -= 1
+            waiter = waiters.popleft()
+            if not waiters:
+                del self.tenants[tenant]
+                del self.deficits[tenant]
+            elif self.deficits[tenant] < 1:
+                # quantum used up, next tenant's turn
+                self.tenants.move_to_end(tenant)
+            return waiter
+
+
+class FairScheduler:
+    """Bound concurrent node calls and decide who goes next when they are saturated.
+
+    Higher priority classes are always served first. Within a class, tenants are served by deficit round robin,
+    a tenant with weight w getting w calls per round (1 by default), so one tenant bulk-querying cannot starve
+    the others.
+    """
+
+    def __init__(self, max_concurrency: int, tenant_weights: Optional[Dict[Hashable, float]] = None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        # a tenant without a positive weight would never earn a call, and pop would spin forever
+        invalid = [f"{tenant}={weight}" for tenant, weight in (tenant_weights or {}).items() if not weight > 0]
+        if invalid:
+            raise ValueError(f"Tenant weights must be greater than 0, got {', '.join(invalid)}")
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.tenant_weights = tenant_weights or {}
+        self._classes = {priority: _TenantQueues(self.tenant_weights) for priority in RequestPriority}
+
+    def _has_waiters(self) -> bool:
+        return any(queue.tenants for queue in self._classes.values())
+
+    async def acquire(self, priority: RequestPriority = RequestPriority.NORMAL, tenant: Hashable = None):
+        priority = RequestPriority(priority)
+        label = priority.name.lower()
+        if self.in_flight < self.max_concurrency and not self._has_waiters():
+            self.in_flight += 1
+            dispatch_wait.labels(priority=label).observe(0)
+            return
+
+        start = time.monotonic()
+        queue = self._classes[priority]
+        waiter = asyncio.get_running_loop().create_future()
+        queue.push(tenant, waiter)
+        dispatch_queue_depth.labels(priority=label).inc()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over while the caller went away
+                self.release()
+            else:
+                queue.remove(tenant, waiter)
+            raise
+        finally:
+            dispatch_queue_depth.labels(priority=label).dec()
+            dispatch_wait.labels(priority=label).observe(time.monotonic() - start)
+
+    def release(self):
+        self.in_flight -= 1
+        while self.in_flight < self.max_concurrency:
+            queue = next((queue for queue in self._classes.values() if queue.tenants), None)
+            if queue is None:
+                return
+            waiter = queue.pop()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
@@ -0,0 +1,155 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import contextvars
+from typing import Any, Callable, Optional
+
+import numpy as np
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+from .logger import CustomLogger
+
+logger = CustomLogger("comps-core-serialization")
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+SERIALIZATION_FORMATS = {"json": JSON, "msgpack": MSGPACK}
+
+# with msgpack, float lists under these keys travel as raw little-endian float32 instead of 9 bytes per float
+EMBEDDING_KEYS = ("embedding",)
+FLOAT32_EXT_TYPE = 1
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# format the current request asked its reply in, read by NegotiatedResponse
+_reply_content_type = contextvars.ContextVar("reply_content_type", default=JSON)
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        m = "msgpack is not installed. Please install it using 'pip install msgpack'."
+        logger.error(m)
+        raise
+    return msgpack
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not serializable: {type(obj)}")
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray) and obj.dtype == np.float32 and obj.ndim == 1:
+        return _msgpack().ExtType(FLOAT32_EXT_TYPE, obj.astype("<f4", copy=False).tobytes())
+    return _default(obj)
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == FLOAT32_EXT_TYPE:
+        return np.frombuffer(data, dtype="<f4").tolist()
+    return _msgpack().ExtType(code, data)
+
+
+def _pack_embeddings(obj: Any) -> Any:
+    """Turn the float lists under EMBEDDING_KEYS into float32 arrays, copying only the containers on the way."""
+    if isinstance(obj, dict):
+        packed = {}
+        for key, value in obj.items():
+            if key in EMBEDDING_KEYS and isinstance(value, list) and value:
+                if isinstance(value[0], float):
+                    value = np.asarray(value, dtype=np.float32)
+                elif isinstance(value[0], list) and value[0] and isinstance(value[0][0], float):
+                    value = [np.asarray(v, dtype=np.float32) for v in value]
+            packed[key] = _pack_embeddings(value)
+        return packed
+    if isinstance(obj, list):
+        return [_pack_embeddings(item) for item in obj]
+    return obj
+
+
+def content_type_of(header: Optional[str]) -> str:
+    """Return the bare media type of a Content-Type header, JSON when absent."""
+    if not header:
+        return JSON
+    return header.split(";", 1)[0].strip().lower()
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Return the reply format for an Accept header: msgpack only if the client prefers it."""
+    if not accept:
+        return JSON
+    for media_range in accept.split(","):
+        media_type = content_type_of(media_range)
+        if media_type in (MSGPACK, "application/x-msgpack"):
+            return MSGPACK
+        if media_type in (JSON, "application/*", "*/*"):
+            return JSON
+    return JSON
+
+
+def dumps(obj: Any, content_type: str = JSON) -> bytes:
+    """Serialize obj to content_type, numpy arrays and pydantic models included."""
+    if content_type == MSGPACK:
+        return _msgpack().packb(_pack_embeddings(obj), default=_msgpack_default, use_bin_type=True)
+    return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+
+def loads(payload: bytes, content_type: str = JSON) -> Any:
+    if content_type in (MSGPACK, "application/x-msgpack"):
+        return _msgpack().unpackb(payload, ext_hook=_ext_hook, raw=False)
+    return orjson.loads(payload)
+
+
+class NegotiatedResponse(JSONResponse):
+    """Default response class of the services, rendered with orjson, or msgpack when the request asked for it."""
+
+    def render(self, content: Any) -> bytes:
+        content_type = _reply_content_type.get()
+        self.media_type = content_type
+        return dumps(content, content_type)
+
+
+class _NegotiatedRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+class NegotiatedRoute(APIRoute):
+    """Route accepting JSON or msgpack bodies, and replying in the format the Accept header prefers."""
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def negotiated_route_handler(request: Request) -> Response:
+            scope = request.scope
+            body = None
+            if content_type_of(request.headers.get("content-type")) in (MSGPACK, "application/x-msgpack"):
+                # FastAPI only validates JSON bodies, present the decoded one as such
+                body = await request.body()
+                headers = [(k, v) for k, v in scope["headers"] if k != b"content-type"]
+                scope = dict(scope, headers=headers + [(b"content-type", JSON.encode())])
+            request = _NegotiatedRequest(scope, request.receive)
+            if body is not None:
+                request._body = body
+                request._json = loads(body, MSGPACK)
+
+            token = _reply_content_type.set(negotiate(request.headers.get("accept")))
+            try:
+                return await route_handler(request)
+            finally:
+                _reply_content_type.reset(token)
+
+        return negotiated_route_handler
@@ -0,0 +1,53 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("task", "joined", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.joined = 0  # callers that shared this call
+        self.waiters = 0  # callers still waiting for it
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one.
+
+    While a call for a key is in flight, further callers with the same key wait for it instead of starting their
+    own, and each of them gets its own copy of the result. Nothing is kept once the call finished, this is not a
+    cache. The shared call is cancelled only when every caller waiting for it was cancelled.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None or call.task.done():
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+
+        call.joined += 1
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+        # callers may mutate what they get, e.g. in align_outputs
+        return result if call.joined == 1 else copy.deepcopy(result)
+
+    def __len__(self):
+        return len(self._calls)
@@ -0,0 +1,82 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import time
+
+from prometheus_client import Gauge, Histogram
+
+# the tokens/s and bytes/s gauges of a service are updated at most every interval seconds
+STREAM_METRICS_FLUSH_INTERVAL = float(os.getenv("STREAM_METRICS_FLUSH_INTERVAL", 1.0))
+
+stream_tokens_per_second = Gauge(
+    "megaservice_stream_tokens_per_second", "Tokens streamed per second over the last flush interval", ["service"]
+)
+stream_bytes_per_second = Gauge(
+    "megaservice_stream_bytes_per_second", "Bytes streamed per second over the last flush interval", ["service"]
+)
+
+
+class StreamMeter:
+    """Token metrics of the replies one service streams, cheap enough to update per token.
+
+    The latency histograms are shared by all services and observed per token. The tokens and bytes are only counted
+    per token, the tokens/s and bytes/s of the service are set from them at each flush. All updates happen in the
+    event loop.
+    """
+
+    __slots__ = (
+        "service",
+        "first_token_latency",
+        "inter_token_latency",
+        "flush_interval",
+        "_tokens",
+        "_bytes",
+        "_flushed_at",
+        "_next_flush",
+        "_tokens_per_second",
+        "_bytes_per_second",
+    )
+
+    def __init__(
+        self,
+        service: str,
+        first_token_latency: Histogram,
+        inter_token_latency: Histogram,
+        flush_interval: float = STREAM_METRICS_FLUSH_INTERVAL,
+    ):
+        self.service = service
+        self.first_token_latency = first_token_latency
+        self.inter_token_latency = inter_token_latency
+        self.flush_interval = flush_interval
+        self._tokens = 0
+        self._bytes = 0
+        self._flushed_at = time.monotonic()
+        self._next_flush = self._flushed_at + flush_interval
+        self._tokens_per_second = stream_tokens_per_second.labels(service=service)
+        self._bytes_per_second = stream_bytes_per_second.labels(service=service)
+
+    def token(self, token_start: float, is_first: bool, size: int = 0) -> float:
+        """Record a token of size bytes produced since token_start, return the current time."""
+        now = time.monotonic()
+        if is_first:
+            self.first_token_latency.observe(now - token_start)
+        else:
+            self.inter_token_latency.observe(now - token_start)
+        self._tokens += 1
+        self._bytes += size
+        if now >= self._next_flush:
+            self.flush(now)
+        return now
+
+    def flush(self, now: float = None):
+        """Update the rate gauges from the tokens and bytes counted since the last flush."""
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._flushed_at
+        if elapsed > 0:
+            self._tokens_per_second.set(self._tokens / elapsed)
+            self._bytes_per_second.set(self._bytes / elapsed)
+        self._tokens = 0
+        self._bytes = 0
+        self._flushed_at = now
+        self._next_flush = now + self.flush_interval
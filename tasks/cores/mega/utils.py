@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import base64
+import hashlib
 import ipaddress
 import json
 import multiprocessing
@@ -11,6 +12,7 @@ from io import BytesIO
 from socket import AF_INET, SOCK_STREAM, socket
 from typing import List, Optional, Union
 
+import orjson
 import requests
 # from PIL import Image
 
@@ -201,3 +203,15 @@ def sanitize_env(value: Optional[str]) -> Optional[str]:
     elif value.startswith("'") and value.endswith("'"):
         value = value[1:-1]
     return value
+
+
+def canonical_hash(data) -> str:
+    """Hash a JSON-like payload independently of its dict key order.
+
+    :param data: The payload, e.g. the input dict of a microservice request.
+    :return: The hex digest of the canonical serialization.
+    """
+    serialized = orjson.dumps(
+        data, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    )
+    return hashlib.sha256(serialized).hexdigest()
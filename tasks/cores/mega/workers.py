@@ -0,0 +1,175 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import signal
+import socket
+import tempfile
+import time
+from typing import Callable, Dict
+
+from .base_statistics import STATISTICS_DIR_ENV
+from .logger import CustomLogger
+
+logger = CustomLogger("comps-core-workers")
+
+# seconds a worker gets to finish its in-flight requests before it is killed
+WORKER_GRACEFUL_TIMEOUT = float(os.getenv("MICROSERVICE_WORKER_GRACEFUL_TIMEOUT", 30))
+# how the parent asks a worker to drain and exit. Unlike a forwarded SIGTERM, it never counts as the second stop
+# signal of a worker already draining on the SIGINT or SIGTERM sent to the whole process group, e.g. by Ctrl-C
+WORKER_DRAIN_SIGNAL = signal.SIGUSR1
+
+
+def create_reuseport_socket(host: str, port: int) -> socket.socket:
+    """Bind a listening socket with SO_REUSEPORT, so every worker binds its own and the kernel spreads connections."""
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("Worker processes need SO_REUSEPORT, which this platform does not support")
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        sock.set_inheritable(True)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _exit_worker(signum, frame):
+    # until the worker serves and drains on these signals itself
+    raise SystemExit(0)
+
+
+def _mark_process_dead(pid: int):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
+
+
+class WorkerPool:
+    """Run `serve` in `workers` forked processes and supervise them.
+
+    `serve` is called in each child with its worker index and must block until the worker is told to exit by
+    WORKER_DRAIN_SIGNAL, or SIGTERM or SIGINT sent to it directly; it should finish the requests it serves first. The
+    parent respawns workers that die, restarts them one at a time on SIGHUP, and on SIGTERM or SIGINT asks all of them
+    to exit with WORKER_DRAIN_SIGNAL, killing those still running after `graceful_timeout` seconds.
+
+    Metrics are only aggregated across workers when PROMETHEUS_MULTIPROC_DIR names an empty directory before the
+    service is imported, the statistics of /v1/statistics always are.
+    """
+
+    def __init__(self, serve: Callable[[int], None], workers: int, graceful_timeout: float = WORKER_GRACEFUL_TIMEOUT):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.serve = serve
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        self._started_at: Dict[int, float] = {}
+        self._signal = None
+
+        if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            logger.warning("PROMETHEUS_MULTIPROC_DIR is not set, /metrics only reports the worker answering it")
+        if not os.getenv(STATISTICS_DIR_ENV):
+            # inherited by the workers, which share their statistics through it
+            os.environ[STATISTICS_DIR_ENV] = tempfile.mkdtemp(prefix="opea-statistics-")
+
+    def _spawn(self, index: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                # a hangup of the whole process group only restarts the workers through the parent
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                for sig in (signal.SIGTERM, signal.SIGINT, WORKER_DRAIN_SIGNAL):
+                    signal.signal(sig, _exit_worker)
+                self.serve(index)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 0
+            except BaseException as e:
+                logger.error(f"Worker {index} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = index
+        self._started_at[index] = time.monotonic()
+        logger.info(f"Started worker {index} (pid {pid})")
+        return pid
+
+    def _on_signal(self, signum, frame):
+        self._signal = signum
+
+    def _reap(self) -> Dict[int, int]:
+        """Collect the exited workers, return their pid -> worker index."""
+        exited = {}
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            index = self.children.pop(pid, None)
+            if index is None:
+                continue
+            _mark_process_dead(pid)
+            exited[pid] = index
+            logger.info(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}")
+        return exited
+
+    def _stop(self, pids):
+        """Ask the workers to drain and wait for them, SIGKILL the ones still running at the deadline."""
+        pids = [pid for pid in pids if pid in self.children]
+        for pid in pids:
+            try:
+                os.kill(pid, WORKER_DRAIN_SIGNAL)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while any(pid in self.children for pid in pids):
+            if time.monotonic() >= deadline:
+                for pid in pids:
+                    if pid in self.children:
+                        logger.warning(f"Worker {self.children[pid]} (pid {pid}) did not exit in time, killing it")
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                deadline = float("inf")
+            self._reap()
+            time.sleep(0.05)
+
+    def rolling_restart(self):
+        """Replace the workers one at a time, each replacement starts before the worker it replaces drains."""
+        logger.info("Rolling restart of the workers")
+        for pid, index in list(self.children.items()):
+            self._spawn(index)
+            self._stop([pid])
+
+    def run(self):
+        """Start the workers and supervise them until SIGTERM or SIGINT."""
+        previous = {sig: signal.signal(sig, self._on_signal) for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)}
+        try:
+            for index in range(self.workers):
+                self._spawn(index)
+            while True:
+                if self._signal in (signal.SIGTERM, signal.SIGINT):
+                    break
+                if self._signal == signal.SIGHUP:
+                    self._signal = None
+                    self.rolling_restart()
+                for pid, index in self._reap().items():
+                    logger.warning(f"Worker {index} (pid {pid}) died, respawning it")
+                    if time.monotonic() - self._started_at[index] < 1:
+                        # do not fork in a tight loop when workers fail right at startup
+                        time.sleep(1)
+                    self._spawn(index)
+                time.sleep(0.2)
+            logger.info(f"Stopping {len(self.children)} workers")
+            self._stop(list(self.children))
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
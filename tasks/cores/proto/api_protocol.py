@@ -5,11 +5,14 @@ import time
 from enum import IntEnum
 from typing import Any, Dict, List, Literal, Optional, Union
 
+import numpy as np
 import shortuuid
 from fastapi import File, Form, UploadFile
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, NonNegativeFloat, PositiveInt
 
+from .embedding_codec import EMBEDDING_ENCODING_PATTERN, decode_embeddings
+
 
 class ServiceCard(BaseModel):
     object: str = "service"
@@ -233,7 +236,8 @@ class EmbeddingRequest(BaseModel):
     # https://platform.openai.com/docs/api-reference/embeddings
     model: Optional[str] = None
     input: Union[List[int], List[List[int]], str, List[str]]
-    encoding_format: Optional[str] = Field("float", pattern="^(float|base64)$")
+    # beyond OpenAI's float|base64 (float32): base64_float16 and base64_int8, see embedding_codec
+    encoding_format: Optional[str] = Field("float", pattern=EMBEDDING_ENCODING_PATTERN)
     dimensions: Optional[int] = None
     user: Optional[str] = None
 
@@ -252,10 +256,16 @@ class EmbeddingResponse(BaseModel):
     model: Optional[str] = None
     data: List[EmbeddingResponseData]
     usage: Optional[UsageInfo] = None
+    encoding_format: Optional[str] = Field("float", pattern=EMBEDDING_ENCODING_PATTERN)
+
+    def embedding_array(self) -> np.ndarray:
+        """Decode the embeddings to a (n, dim) float32 array."""
+        return decode_embeddings([item.embedding for item in self.data], self.encoding_format)
 
 
 class RetrievalRequest(BaseModel):
-    embedding: Union[EmbeddingResponse, List[float]] = None
+    embedding: Union[EmbeddingResponse, List[float], str] = None
+    encoding_format: Optional[str] = Field("float", pattern=EMBEDDING_ENCODING_PATTERN)
     input: Optional[str] = None  # search_type maybe need, like "mmr"
     search_type: str = "similarity"
     k: PositiveInt = 4
@@ -268,6 +278,12 @@ class RetrievalRequest(BaseModel):
     # define
     request_type: Literal["retrieval"] = "retrieval"
 
+    def embedding_array(self) -> np.ndarray:
+        """Decode the query embedding to a float32 array, only when the retriever needs it."""
+        if isinstance(self.embedding, EmbeddingResponse):
+            return self.embedding.embedding_array()[0]
+        return decode_embeddings(self.embedding, self.encoding_format)
+
 
 class RetrievalRequestArangoDB(RetrievalRequest):
     graph_name: str | None = None
@@ -418,9 +434,9 @@ class ChatCompletionRequest(BaseModel):
 
     # embedding
     input: Union[List[int], List[List[int]], str, List[str]] = None  # user query/question from messages[-]
-    encoding_format: Optional[str] = Field("float", pattern="^(float|base64)$")
+    encoding_format: Optional[str] = Field("float", pattern=EMBEDDING_ENCODING_PATTERN)
     dimensions: Optional[int] = None
-    embedding: Union[EmbeddingResponse, List[float]] = Field(default_factory=list)
+    embedding: Union[EmbeddingResponse, List[float], str] = Field(default_factory=list)
 
     # retrieval
     search_type: str = "similarity"
@@ -439,6 +455,12 @@ class ChatCompletionRequest(BaseModel):
     # define
     request_type: Literal["chat"] = "chat"
 
+    def embedding_array(self) -> np.ndarray:
+        """Decode the query embedding to a float32 array, only when the retriever needs it."""
+        if isinstance(self.embedding, EmbeddingResponse):
+            return self.embedding.embedding_array()[0]
+        return decode_embeddings(self.embedding, self.encoding_format)
+
 
 class DocSumChatCompletionRequest(ChatCompletionRequest):
     summary_type: str = "auto"  # can be "auto", "stuff", "truncate", "map_reduce", "refine"
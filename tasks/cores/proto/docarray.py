@@ -9,6 +9,8 @@ from docarray.documents import AudioDoc
 from docarray.typing import AudioUrl, ImageUrl
 from pydantic import Field, NonNegativeFloat, PositiveInt, conint, conlist, field_validator
 
+from .embedding_codec import EMBEDDING_ENCODING_PATTERN, decode_embeddings
+
 
 class TopologyInfo:
     # will not keep forwarding to the downstream nodes in the black list
@@ -94,7 +96,9 @@ class DocPath(BaseDoc):
 
 class EmbedDoc(BaseDoc):
     text: Union[str, List[str]]
-    embedding: Union[conlist(float, min_length=0), List[conlist(float, min_length=0)]]
+    # floats, or base64 strings in encoding_format, one per text when batched
+    embedding: Union[conlist(float, min_length=0), List[conlist(float, min_length=0)], str, List[str]]
+    encoding_format: str = Field("float", pattern=EMBEDDING_ENCODING_PATTERN)
     search_type: str = "similarity"
     k: PositiveInt = 4
     distance_threshold: Optional[float] = None
@@ -107,6 +111,10 @@ class EmbedDoc(BaseDoc):
     qdrant_host: str = "localhost"
     qdrant_port: int = 6333
 
+    def embedding_array(self) -> np.ndarray:
+        """Decode the embedding(s) to a float32 array, only when the consumer needs it."""
+        return decode_embeddings(self.embedding, self.encoding_format)
+
 
 class EmbedMultimodalDoc(EmbedDoc):
     # extend EmbedDoc with these attributes
@@ -0,0 +1,54 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import base64
+from typing import List, Union
+
+import numpy as np
+
+# "base64" is the OpenAI format, little-endian float32. The others are smaller and lossy: float16, and int8
+# quantized symmetrically per vector, prefixed with its float32 scale.
+EMBEDDING_ENCODINGS = ("float", "base64", "base64_float16", "base64_int8")
+EMBEDDING_ENCODING_PATTERN = "^(" + "|".join(EMBEDDING_ENCODINGS) + ")$"
+
+
+def encode_embedding(vector, encoding_format: str = "base64") -> Union[List[float], str]:
+    """Encode one embedding vector (a list or an array) in encoding_format."""
+    vector = np.asarray(vector, dtype=np.float32)
+    if encoding_format == "float":
+        return vector.tolist()
+    if encoding_format == "base64":
+        payload = vector.astype("<f4", copy=False).tobytes()
+    elif encoding_format == "base64_float16":
+        payload = vector.astype("<f2").tobytes()
+    elif encoding_format == "base64_int8":
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127 if peak else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        payload = np.float32(scale).astype("<f4").tobytes() + quantized.tobytes()
+    else:
+        raise ValueError(f"Unknown embedding encoding format: {encoding_format}")
+    return base64.b64encode(payload).decode("ascii")
+
+
+def decode_embedding(data: Union[List[float], str], encoding_format: str = "base64") -> np.ndarray:
+    """Decode one embedding vector to a float32 array, lists of floats are accepted whatever the format."""
+    if not isinstance(data, str):
+        return np.asarray(data, dtype=np.float32)
+    payload = base64.b64decode(data)
+    if encoding_format in ("base64", "float"):
+        # a string under "float" is what OpenAI-compatible servers send for "base64"
+        return np.frombuffer(payload, dtype="<f4")
+    if encoding_format == "base64_float16":
+        return np.frombuffer(payload, dtype="<f2").astype(np.float32)
+    if encoding_format == "base64_int8":
+        scale = np.frombuffer(payload[:4], dtype="<f4")[0]
+        return np.frombuffer(payload[4:], dtype=np.int8).astype(np.float32) * scale
+    raise ValueError(f"Unknown embedding encoding format: {encoding_format}")
+
+
+def decode_embeddings(data, encoding_format: str = "base64") -> np.ndarray:
+    """Decode one embedding or a batch of them (a list of encoded vectors) to a float32 array."""
+    if isinstance(data, list) and data and not isinstance(data[0], (int, float)):
+        return np.stack([decode_embedding(vector, encoding_format) for vector in data])
+    return decode_embedding(data, encoding_format)
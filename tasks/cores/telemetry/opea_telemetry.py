@@ -8,7 +8,6 @@ from functools import wraps
 
 from opentelemetry import trace
 from opentelemetry.context.contextvars_context import ContextVarsRuntimeContext
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter as HTTPSpanExporter
 from opentelemetry.sdk.resources import SERVICE_NAME, Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
@@ -41,6 +40,9 @@ ENABLE_OPEA_TELEMETRY = False
 telemetry_endpoint = os.environ.get("TELEMETRY_ENDPOINT")
 if telemetry_endpoint is not None:
 
+    # the OTLP exporter (protobuf, requests) is only imported when traces are exported
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter as HTTPSpanExporter
+
     ENABLE_OPEA_TELEMETRY = True
     logger.info(f" Has Telemetry Endpoint :  {telemetry_endpoint}")
     traceProvider.add_span_processor(BatchSpanProcessor(HTTPSpanExporter(endpoint=telemetry_endpoint)))
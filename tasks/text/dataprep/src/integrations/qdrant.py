@@ -1,17 +1,22 @@
+import asyncio
 import json
 import os
-from typing import List, Optional, Union
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Union
 
 from fastapi import Body, HTTPException
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceBgeEmbeddings, HuggingFaceInferenceAPIEmbeddings
-from langchain_community.vectorstores import Qdrant
 from langchain_huggingface import HuggingFaceEmbeddings
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http import models
 
 from AIComps.tasks import CustomLogger, DocPath, OpeaComponent, OpeaComponentRegistry, ServiceType
 from AIComps.tasks.cores.proto.api_protocol import DataprepRequest
+from AIComps.tasks.text.dataprep.src.integrations.qdrant_ingest import QdrantIngestor
+from AIComps.tasks.text.dataprep.src.integrations.table_descriptions import TableDescriber
 from AIComps.tasks.text.dataprep.src.utils import (
     encode_filename,
     get_separators,
@@ -19,10 +24,6 @@ from AIComps.tasks.text.dataprep.src.utils import (
     save_content_to_local_disk,
 )
 from tree_parser.treeparser import TreeParser
-from tree_parser.node import Node
-from tree_parser.table import Table
-
-import requests
 
 logger = CustomLogger("opea_dataprep_qdrant")
 logflag = os.getenv("LOGFLAG", False)
@@ -39,6 +40,218 @@ HF_TOKEN = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACEHUB_API_TOKEN", "")
 DEFAULT_COLLECTION_NAME = os.getenv("COLLECTION_NAME", "rag-qdrant")
 BASE_OUTPUTS_DIR = os.path.join(os.path.expanduser("~"), "pdf-results")
 
+# clients are kept per (host, port), the least recently used beyond the cache size or idle for longer than the
+# timeout are closed
+QDRANT_CLIENT_CACHE_SIZE = int(os.getenv("QDRANT_CLIENT_CACHE_SIZE", 32))
+QDRANT_CLIENT_IDLE_TIMEOUT = float(os.getenv("QDRANT_CLIENT_IDLE_TIMEOUT", 300))
+# a Qdrant that answered a request within this many seconds is not probed before the next one
+QDRANT_HEALTH_CHECK_INTERVAL = float(os.getenv("QDRANT_HEALTH_CHECK_INTERVAL", 30))
+
+
+def _getenv_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+# settings of the collections created on ingest, unset ones are left to Qdrant's defaults
+# size of the vectors, detected from the embedder when unset
+QDRANT_VECTOR_SIZE = _getenv_int("QDRANT_VECTOR_SIZE")
+QDRANT_DISTANCE = os.getenv("QDRANT_DISTANCE", "Cosine")
+# keep the original vectors on disk, memory-mapped
+QDRANT_ON_DISK = os.getenv("QDRANT_ON_DISK", "false").lower() == "true"
+QDRANT_HNSW_M = _getenv_int("QDRANT_HNSW_M")
+QDRANT_HNSW_EF_CONSTRUCT = _getenv_int("QDRANT_HNSW_EF_CONSTRUCT")
+QDRANT_HNSW_ON_DISK = os.getenv("QDRANT_HNSW_ON_DISK", "false").lower() == "true"
+QDRANT_INDEXING_THRESHOLD = _getenv_int("QDRANT_INDEXING_THRESHOLD")
+QDRANT_MEMMAP_THRESHOLD = _getenv_int("QDRANT_MEMMAP_THRESHOLD")
+# "int8" for scalar quantization, 4x less memory for the vectors searched
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "").lower()
+QDRANT_QUANTIZATION_QUANTILE = float(os.getenv("QDRANT_QUANTIZATION_QUANTILE", 0.99))
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+
+
+def collection_config(vector_size: int) -> dict:
+    """Return the create_collection arguments of a collection of vector_size vectors, from the QDRANT_* settings."""
+    config = {
+        "vectors_config": models.VectorParams(
+            size=vector_size,
+            distance=models.Distance(QDRANT_DISTANCE.capitalize()),
+            on_disk=QDRANT_ON_DISK or None,
+        )
+    }
+    hnsw = {"m": QDRANT_HNSW_M, "ef_construct": QDRANT_HNSW_EF_CONSTRUCT, "on_disk": QDRANT_HNSW_ON_DISK or None}
+    if any(value is not None for value in hnsw.values()):
+        config["hnsw_config"] = models.HnswConfigDiff(**hnsw)
+    optimizers = {"indexing_threshold": QDRANT_INDEXING_THRESHOLD, "memmap_threshold": QDRANT_MEMMAP_THRESHOLD}
+    if any(value is not None for value in optimizers.values()):
+        config["optimizers_config"] = models.OptimizersConfigDiff(**optimizers)
+    if QDRANT_QUANTIZATION == "int8":
+        config["quantization_config"] = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=QDRANT_QUANTIZATION_QUANTILE,
+                always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM,
+            )
+        )
+    elif QDRANT_QUANTIZATION:
+        raise ValueError(f"Unsupported QDRANT_QUANTIZATION {QDRANT_QUANTIZATION!r}, only 'int8' is supported")
+    return config
+
+
+class _CachedQdrantClient:
+    __slots__ = ("host", "port", "sync_client", "async_client", "last_used", "healthy_at", "leases")
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.sync_client = None
+        self.async_client = None
+        self.last_used = time.monotonic()
+        self.healthy_at = None
+        self.leases = 0  # requests using the clients, which are not closed meanwhile
+
+    def close_sync(self):
+        """Close the sync client, the async one can only be closed by `close`."""
+        try:
+            if self.sync_client is not None:
+                self.sync_client.close()
+        except Exception as e:
+            logger.warning(f"Closing the Qdrant client of {self.host}:{self.port} failed: {e}")
+        self.sync_client = None
+
+    async def close(self):
+        self.close_sync()
+        try:
+            if self.async_client is not None:
+                await self.async_client.close()
+        except Exception as e:
+            logger.warning(f"Closing the Qdrant client of {self.host}:{self.port} failed: {e}")
+        self.async_client = None
+
+
+class QdrantClientCache:
+    """Qdrant clients shared by the requests to the same (host, port), sync or async.
+
+    Holds at most `max_size` hosts, evicting the least recently used, and closes the clients of hosts idle for
+    `idle_timeout` seconds. The clients of a host leased by `acquire` are neither evicted nor closed until `release`,
+    the cache may exceed `max_size` meanwhile. Evicted sync clients are closed right away, async ones by the next
+    coroutine using the cache. Health is tracked passively: a host that served a request
+    successfully less than `health_check_interval` seconds ago is not probed again.
+    """
+
+    def __init__(
+        self,
+        max_size: int = QDRANT_CLIENT_CACHE_SIZE,
+        idle_timeout: float = QDRANT_CLIENT_IDLE_TIMEOUT,
+        health_check_interval: float = QDRANT_HEALTH_CHECK_INTERVAL,
+    ):
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._entries = OrderedDict()  # (host, port) -> _CachedQdrantClient
+        self._evicted = []  # entries to close, async clients can only be closed from a coroutine
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _entry(self, host: str, port: int) -> _CachedQdrantClient:
+        now = time.monotonic()
+        key = (host, int(port))
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _CachedQdrantClient(host, int(port))
+        else:
+            self._entries.move_to_end(key)
+        entry.last_used = now
+
+        # the least recently used come first, leased entries and the one returned are kept whatever their age
+        for other_key, other in list(self._entries.items()):
+            if other is entry or other.leases:
+                continue
+            if len(self._entries) > self.max_size or now - other.last_used > self.idle_timeout:
+                self._evicted.append(self._entries.pop(other_key))
+        return entry
+
+    async def _close_evicted(self):
+        evicted, self._evicted = self._evicted, []
+        for entry in evicted:
+            logger.info(f"Closing the Qdrant client of {entry.host}:{entry.port}")
+            await entry.close()
+
+    def _close_evicted_sync(self):
+        # the async clients wait for the next coroutine using the cache
+        for entry in self._evicted:
+            if entry.sync_client is not None:
+                logger.info(f"Closing the Qdrant client of {entry.host}:{entry.port}")
+                entry.close_sync()
+        self._evicted = [entry for entry in self._evicted if entry.async_client is not None]
+
+    def get(self, host: str, port: int) -> QdrantClient:
+        """Return the sync client of host:port."""
+        entry = self._entry(host, port)
+        self._close_evicted_sync()
+        if entry.sync_client is None:
+            entry.sync_client = QdrantClient(host=entry.host, port=entry.port)
+        return entry.sync_client
+
+    async def get_async(self, host: str, port: int) -> AsyncQdrantClient:
+        """Return the async client of host:port."""
+        entry = self._entry(host, port)
+        await self._close_evicted()
+        if entry.async_client is None:
+            entry.async_client = AsyncQdrantClient(host=entry.host, port=entry.port)
+        return entry.async_client
+
+    async def acquire(self, host: str, port: int) -> AsyncQdrantClient:
+        """Return the async client of host:port, leased until the matching `release`."""
+        entry = self._entry(host, port)
+        entry.leases += 1
+        try:
+            return await self.get_async(host, port)
+        except BaseException:
+            self.release(host, port)
+            raise
+
+    def release(self, host: str, port: int):
+        entry = self._entries.get((host, int(port)))
+        if entry is not None and entry.leases:
+            entry.leases -= 1
+            # idle from now on
+            entry.last_used = time.monotonic()
+
+    def mark_healthy(self, host: str, port: int):
+        entry = self._entries.get((host, int(port)))
+        if entry is not None:
+            entry.healthy_at = time.monotonic()
+
+    def mark_unhealthy(self, host: str, port: int):
+        entry = self._entries.get((host, int(port)))
+        if entry is not None:
+            entry.healthy_at = None
+
+    async def check_health(self, host: str, port: int) -> bool:
+        """Probe host:port, unless it answered recently."""
+        client = await self.get_async(host, port)
+        entry = self._entries[(host, int(port))]
+        if entry.healthy_at is not None and time.monotonic() - entry.healthy_at < self.health_check_interval:
+            return True
+        try:
+            info = await client.info()
+        except Exception as e:
+            logger.error(f"Qdrant health check of {host}:{port} failed: {e}")
+            entry.healthy_at = None
+            return False
+        if logflag:
+            logger.info(info)
+        entry.healthy_at = time.monotonic()
+        return True
+
+    async def close(self):
+        self._evicted.extend(self._entries.values())
+        self._entries.clear()
+        await self._close_evicted()
+
+
 @OpeaComponentRegistry.register("OPEA_DATAPREP_QDRANT")
 class OpeaQdrantDataprep(OpeaComponent):
     """Dataprep component for Qdrant ingestion and search services."""
@@ -66,98 +279,116 @@ class OpeaQdrantDataprep(OpeaComponent):
         else:
             self.embedder = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
 
-        self.client = None
-
-    def create_qdrant_client(self, host, port):
-        """Create a Qdrant client instance with the given host and port."""
-        from qdrant_client import QdrantClient
-        self.client = QdrantClient(host=host, port=port)
-
-    def check_health(self, host, port) -> bool:
-        """Checks the health of the Qdrant service."""
+        self.clients = QdrantClientCache()
+        self.ingestor = QdrantIngestor(self.embedder)
+        self.table_describer = TableDescriber()
+        self.vector_size = QDRANT_VECTOR_SIZE or len(self.embedder.embed_query("vector size"))
+        self.collection_config = collection_config(self.vector_size)
+        logger.info(f"Qdrant collections are created with {self.collection_config}")
+        self.collections = {}  # (host, port, collection name) => vector size of the collection
+        self._collections_lock = asyncio.Lock()
+
+    def create_qdrant_client(self, host, port) -> QdrantClient:
+        """Return the cached sync Qdrant client of the given host and port."""
+        return self.clients.get(host, port)
+
+    async def close(self):
+        """Close the pooled clients of the Qdrant hosts and of the LLM server describing tables."""
+        await self.table_describer.close()
+        await self.clients.close()
+
+    async def check_health(self, host, port) -> bool:
+        """Checks the health of the Qdrant service, at most every QDRANT_HEALTH_CHECK_INTERVAL seconds."""
         if self.embedder is None:
             logger.error("Qdrant embedder is not initialized.")
             return False
+        return await self.clients.check_health(host, port)
 
+    @asynccontextmanager
+    async def qdrant(self, host, port):
+        """Yield the async client of a healthy Qdrant, a request failing on it has the next one probe it again.
+
+        The client is leased for the duration of the block, it is not closed under it by the eviction of its host.
+        """
+        client = await self.clients.acquire(host, port)
         try:
-            client = QdrantClient(host=host, port=port)
-            logger.info(client.info())
-            return True
-        except Exception as e:
-            logger.error(f"Qdrant health check failed: {e}")
-            return False
+            if not await self.check_health(host, port):
+                raise HTTPException(status_code=503, detail="Qdrant service is not healthy.")
+            try:
+                yield client
+            except HTTPException:
+                raise
+            except Exception:
+                self.clients.mark_unhealthy(host, port)
+                raise
+            else:
+                self.clients.mark_healthy(host, port)
+        finally:
+            self.clients.release(host, port)
 
-    def collection_exists(self, collection_name: str) -> bool:
+    async def collection_exists(self, client: AsyncQdrantClient, collection_name: str) -> bool:
         """Checks if a collection exists in Qdrant."""
         try:
-            self.client.get_collection(collection_name)
-            return True
+            return await client.collection_exists(collection_name)
         except Exception:
             return False
 
-    def invoke(self, *args, **kwargs):
-        pass
+    def forget_collection(self, host, port, collection_name: str):
+        self.collections.pop((host, int(port), collection_name), None)
 
-    def get_table_description(self, item: Table):
-        server_host_ip = os.getenv("LLM_SERVER_HOST_IP", "localhost")
-        server_port = os.getenv("LLM_SERVER_PORT", 8000)
-        model_name = os.getenv("LLM_MODEL_ID")
-        use_model_param = os.getenv("LLM_USE_MODEL_PARAM", "false").lower() == "true"
-        url = f"http://{server_host_ip}:{server_port}/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "text/event-stream"
-        }
-
-        data = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": """
-                        <s>[INST] <<SYS>>\n You are a helpful, respectful, and honest assistant. Your task is to generate a detailed and descriptive summary of the provided table data in Markdown format, based strictly on the table and its heading. <</SYS>> 
-                        [INST] Your job is to create a clear, specific, and **factual** textual description. **Do not add any external information** or provide an abstract summary. Only base the description on the data from the table and its heading.
-                        
-                        1. Link the **columns** with the corresponding **values** in the rows, referencing the exact terms and terminology from the table. 
-                        2. For each row, explain how each column's data relates to the corresponding values. Ensure the description is **step-by-step** and follows the structure of the table in a natural order.
-                        3. **Do not return the table itself.** Provide only the descriptive summary, written in **paragraphs**.
-                        4. The description should be precise, direct, and **avoid interpretation** or generalization. Stay true to the exact data given.
-                        
-                        Think carefully and make sure to describe every column and its respective values in detail. 
-                    """
-                },
-                {
-                    "role": "user",
-                    "content": f"{item.heading}\n{item.markdown_content}",
-                }
-            ],
-            "stream": False
-        }
-
-        if use_model_param and model_name:
-            data["model"] = model_name
-        else:
-            data["filename"] = ""
+    async def ensure_collection(self, client: AsyncQdrantClient, host, port, collection_name: str):
+        """Create the collection unless it exists, and check it holds vectors of the size of the embedder's.
 
-        response = requests.post(url, headers=headers, json=data)
-        response_data = json.loads(response.text)
-        return response_data['choices'][0]['message']['content']
+        Qdrant is only asked the first time a collection of host:port is used.
+        """
+        key = (host, int(port), collection_name)
+        if key not in self.collections:
+            async with self._collections_lock:
+                if key not in self.collections:
+                    if await self.collection_exists(client, collection_name):
+                        info = await client.get_collection(collection_name)
+                        vectors = info.config.params.vectors
+                        self.collections[key] = vectors.size if isinstance(vectors, models.VectorParams) else None
+                    else:
+                        await client.create_collection(collection_name=collection_name, **self.collection_config)
+                        self.collections[key] = self.vector_size
+                        if logflag:
+                            logger.info(f"Created collection {collection_name} on {host}:{port}")
+        if self.collections[key] != self.vector_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Collection {collection_name} does not hold vectors of size {self.vector_size}, "
+                "the size of the embeddings.",
+            )
+
+    def invoke(self, *args, **kwargs):
+        pass
 
     def is_table_markdown(self, content_str: str) -> bool:
         """Basic check if a content string is a markdown table."""
         return content_str.strip().startswith('|') and '|' in content_str
 
-    def chunk_node_content(self, node_data: dict, text_splitter: RecursiveCharacterTextSplitter) -> List[str]:
-        """Chunks the content of a single JSON node."""
+    def collect_tables(self, node_data: dict) -> List[str]:
+        """Recursively collects the markdown tables of a JSON node and its children."""
+        tables = [
+            item for item in node_data.get("content", []) if isinstance(item, str) and self.is_table_markdown(item)
+        ]
+        for child in node_data.get("children", []):
+            if isinstance(child, dict) and len(child) == 1:
+                tables.extend(self.collect_tables(list(child.values())[0]))
+        return tables
+
+    def chunk_node_content(
+        self, node_data: dict, text_splitter: RecursiveCharacterTextSplitter, table_descriptions: Dict[str, str]
+    ) -> List[str]:
+        """Chunks the content of a single JSON node, its tables are replaced by their description."""
         chunks = []
         content_list = node_data.get("content", [])
         
         for item in content_list:
             if isinstance(item, str):
                 if self.is_table_markdown(item):
-                    mock_node = Node(0, "Mock Table", "/tmp")
-                    mock_table = Table(markdown_content=item, heading="", node=mock_node)
-                    table_description = self.get_table_description(mock_table)
-                    table_chunks = text_splitter.split_text(table_description)
+                    table_chunks = text_splitter.split_text(table_descriptions[item])
                     chunks.extend(table_chunks)
                 else:
                     text_chunks = text_splitter.split_text(item)
@@ -167,15 +398,17 @@ class OpeaQdrantDataprep(OpeaComponent):
         
         return chunks
 
-    def create_chunks(self, node_data: dict, text_splitter: RecursiveCharacterTextSplitter) -> List[str]:
+    def create_chunks(
+        self, node_data: dict, text_splitter: RecursiveCharacterTextSplitter, table_descriptions: Dict[str, str]
+    ) -> List[str]:
         """Recursively creates chunks from a JSON node and its children."""
-        node_chunks = self.chunk_node_content(node_data, text_splitter)
+        node_chunks = self.chunk_node_content(node_data, text_splitter, table_descriptions)
         
         children = node_data.get("children", [])
         for child in children:
             if isinstance(child, dict) and len(child) == 1:
                 child_data = list(child.values())[0]
-                node_chunks.extend(self.create_chunks(child_data, text_splitter))
+                node_chunks.extend(self.create_chunks(child_data, text_splitter, table_descriptions))
             else:
                 logger.warning(f"Unexpected child structure: {child}")
         
@@ -203,38 +436,24 @@ class OpeaQdrantDataprep(OpeaComponent):
             tree_data = json.load(f)
         root_data = tree_data['root']
 
-        chunks = self.create_chunks(root_data, text_splitter)
+        # the tables are described concurrently before chunking, rather than one LLM call at a time while chunking
+        table_descriptions = await self.table_describer.describe_all(self.collect_tables(root_data))
+        chunks = self.create_chunks(root_data, text_splitter, table_descriptions)
 
         if logflag:
             logger.info(f"Done preprocessing. Created {len(chunks)} chunks from the JSON file.")
 
-        self.create_qdrant_client(qdrant_host, qdrant_port)
-        if not self.check_health(qdrant_host, qdrant_port):
-            raise HTTPException(status_code=503, detail="Qdrant service is not healthy.")
-
-        if not self.collection_exists(collection_name):
-            self.client.create_collection(
-                collection_name=collection_name,
-                vectors_config=models.VectorParams(size=768, distance=models.Distance.COSINE),
-            )
-
-        batch_size = 32
-        num_chunks = len(chunks)
-        for i in range(0, num_chunks, batch_size):
-            batch_chunks = chunks[i : i + batch_size]
-            metadatas = [{"user": user, "filename": filename} for _ in batch_chunks]
-            batch_texts = batch_chunks
-
-            _ = Qdrant.from_texts(
-                texts=batch_texts,
-                embedding=self.embedder,
-                metadatas=metadatas,
-                collection_name=collection_name,
-                host=qdrant_host,
-                port=qdrant_port,
-            )
-            if logflag:
-                logger.info(f"Processed batch {i//batch_size + 1}/{(num_chunks-1)//batch_size + 1} for collection {collection_name}")
+        async with self.qdrant(qdrant_host, qdrant_port) as client:
+            await self.ensure_collection(client, qdrant_host, qdrant_port, collection_name)
+            metadatas = [{"user": user, "filename": filename} for _ in chunks]
+            try:
+                num_points = await self.ingestor.ingest(client, collection_name, chunks, metadatas)
+            except Exception:
+                # the collection may have been deleted behind our back
+                self.forget_collection(qdrant_host, qdrant_port, collection_name)
+                raise
+        if logflag:
+            logger.info(f"Ingested {num_points} chunks into collection {collection_name}")
 
         return True
     
@@ -323,18 +542,15 @@ class OpeaQdrantDataprep(OpeaComponent):
         if not qdrant_host or not qdrant_port:
             raise HTTPException(status_code=400, detail="qdrant_host and qdrant_port must be provided")
 
-        self.create_qdrant_client(qdrant_host, qdrant_port)
-        if not self.check_health(qdrant_host, qdrant_port):
-            raise HTTPException(status_code=503, detail="Qdrant service is not healthy.")
+        async with self.qdrant(qdrant_host, qdrant_port) as client:
+            if not await self.collection_exists(client, collection_name):
+                raise HTTPException(status_code=404, detail=f"Collection {collection_name} does not exist.")
 
-        if not self.collection_exists(collection_name):
-            raise HTTPException(status_code=404, detail=f"Collection {collection_name} does not exist.")
-
-        result = self.client.scroll(
-            collection_name=collection_name,
-            limit=100,
-            with_payload=True,
-        )
+            result = await client.scroll(
+                collection_name=collection_name,
+                limit=100,
+                with_payload=True,
+            )
         files = set()
         file_structure = []
         for point in result[0]:
@@ -363,20 +579,17 @@ class OpeaQdrantDataprep(OpeaComponent):
         if not qdrant_host or not qdrant_port:
             raise HTTPException(status_code=400, detail="qdrant_host and qdrant_port must be provided")
 
-        self.create_qdrant_client(qdrant_host, qdrant_port)
-        if not self.check_health(qdrant_host, qdrant_port):
-            raise HTTPException(status_code=503, detail="Qdrant service is not healthy.")
-
-        if not self.collection_exists(collection_name):
-            raise HTTPException(status_code=404, detail=f"Collection {collection_name} does not exist.")
-
-        if file_path == "all":
-            self.client.delete_collection(collection_name)
-            if logflag:
-                logger.info(f"Deleted all files from collection {collection_name}")
-            return {"status": 200, "message": f"All files deleted from collection {collection_name}"}
-        else:
-            self.client.delete(
+        async with self.qdrant(qdrant_host, qdrant_port) as client:
+            if not await self.collection_exists(client, collection_name):
+                raise HTTPException(status_code=404, detail=f"Collection {collection_name} does not exist.")
+
+            if file_path == "all":
+                self.forget_collection(qdrant_host, qdrant_port, collection_name)
+                await client.delete_collection(collection_name)
+                if logflag:
+                    logger.info(f"Deleted all files from collection {collection_name}")
+                return {"status": 200, "message": f"All files deleted from collection {collection_name}"}
+            await client.delete(
                 collection_name=collection_name,
                 points_selector=models.FilterSelector(
                     filter=models.Filter(
@@ -398,11 +611,8 @@ class OpeaQdrantDataprep(OpeaComponent):
         if not qdrant_host or not qdrant_port:
             raise HTTPException(status_code=400, detail="qdrant_host and qdrant_port must be provided")
 
-        self.create_qdrant_client(qdrant_host, qdrant_port)
-        if not self.check_health(qdrant_host, qdrant_port):
-            raise HTTPException(status_code=503, detail="Qdrant service is not healthy.")
-
-        collections = self.client.get_collections()
+        async with self.qdrant(qdrant_host, qdrant_port) as client:
+            collections = await client.get_collections()
         collection_names = [col.name for col in collections.collections]
         if logflag:
             logger.info(f"List of collections: {collection_names}")
@@ -0,0 +1,116 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import os
+import uuid
+from typing import List, Optional
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+
+from AIComps.tasks import CustomLogger
+
+logger = CustomLogger("opea_dataprep_qdrant_ingest")
+logflag = os.getenv("LOGFLAG", False)
+
+# texts embedded per call to the embedder
+QDRANT_EMBED_BATCH_SIZE = int(os.getenv("QDRANT_EMBED_BATCH_SIZE", 256))
+# points per upsert request, and upsert requests in flight
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", 64))
+QDRANT_UPLOAD_WORKERS = int(os.getenv("QDRANT_UPLOAD_WORKERS", 4))
+
+
+class QdrantIngestor:
+    """Embeds texts and upserts them into a Qdrant collection as a pipeline.
+
+    The embedder runs in a thread on batches of `embed_batch_size` texts while the points of the previous batches are
+    upserted by up to `upload_workers` concurrent requests of `upsert_batch_size` points, sent with wait=False. When
+    the uploads fall behind, embedding waits for one of them to finish, so memory stays bounded.
+
+    Points are stored the way the LangChain Qdrant vectorstore stores them, {"page_content", "metadata"} payloads on
+    the unnamed vector, so the retrievers read them unchanged.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        embed_batch_size: int = QDRANT_EMBED_BATCH_SIZE,
+        upsert_batch_size: int = QDRANT_UPSERT_BATCH_SIZE,
+        upload_workers: int = QDRANT_UPLOAD_WORKERS,
+    ):
+        self.embedder = embedder
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self.upload_workers = max(1, upload_workers)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts without blocking the event loop."""
+        return await asyncio.to_thread(self.embedder.embed_documents, texts)
+
+    def points(self, texts: List[str], vectors: List[List[float]], metadatas: List[dict]) -> List[models.PointStruct]:
+        return [
+            models.PointStruct(
+                id=uuid.uuid4().hex,
+                vector=vector,
+                payload={"page_content": text, "metadata": metadata},
+            )
+            for text, vector, metadata in zip(texts, vectors, metadatas)
+        ]
+
+    async def ingest(
+        self,
+        client: AsyncQdrantClient,
+        collection_name: str,
+        texts: List[str],
+        metadatas: Optional[List[dict]] = None,
+    ) -> int:
+        """Embed texts and upsert them with their metadatas into collection_name, return the number of points.
+
+        :param client: async client of the Qdrant holding the collection, which must exist
+        :param collection_name: collection to upsert into
+        :param texts: texts to embed
+        :param metadatas: metadata of each text, none by default
+        """
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if len(metadatas) != len(texts):
+            raise ValueError("texts and metadatas must have the same length")
+
+        num_batches = (len(texts) - 1) // self.embed_batch_size + 1 if texts else 0
+        uploads = set()
+
+        async def wait_uploads(return_when):
+            nonlocal uploads
+            done, uploads = await asyncio.wait(uploads, return_when=return_when)
+            errors = [task.exception() for task in done if task.exception() is not None]
+            if errors:
+                raise errors[0]
+
+        try:
+            # the embedding of the next batch starts as soon as the points of the current one are queued for upload
+            for batch, start in enumerate(range(0, len(texts), self.embed_batch_size)):
+                batch_texts = texts[start : start + self.embed_batch_size]
+                vectors = await self.embed(batch_texts)
+                points = self.points(batch_texts, vectors, metadatas[start : start + self.embed_batch_size])
+                for i in range(0, len(points), self.upsert_batch_size):
+                    if len(uploads) >= self.upload_workers:
+                        await wait_uploads(asyncio.FIRST_COMPLETED)
+                    uploads.add(
+                        asyncio.create_task(
+                            client.upsert(
+                                collection_name=collection_name,
+                                points=points[i : i + self.upsert_batch_size],
+                                wait=False,
+                            )
+                        )
+                    )
+                if logflag:
+                    logger.info(f"Embedded batch {batch + 1}/{num_batches} for collection {collection_name}")
+            if uploads:
+                await wait_uploads(asyncio.ALL_COMPLETED)
+        finally:
+            for task in uploads:
+                task.cancel()
+            await asyncio.gather(*uploads, return_exceptions=True)
+        return len(texts)
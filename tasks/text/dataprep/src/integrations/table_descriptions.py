@@ -0,0 +1,171 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import hashlib
+import os
+from typing import Dict, Iterable, Optional
+
+import aiohttp
+from AIComps.tasks import CustomLogger
+
+logger = CustomLogger("opea_dataprep_table_descriptions")
+logflag = os.getenv("LOGFLAG", False)
+
+LLM_SERVER_HOST_IP = os.getenv("LLM_SERVER_HOST_IP", "localhost")
+LLM_SERVER_PORT = os.getenv("LLM_SERVER_PORT", 8000)
+LLM_MODEL_ID = os.getenv("LLM_MODEL_ID")
+LLM_USE_MODEL_PARAM = os.getenv("LLM_USE_MODEL_PARAM", "false").lower() == "true"
+
+# tables described at the same time, each over one of the pooled connections
+TABLE_DESCRIPTION_CONCURRENCY = int(os.getenv("TABLE_DESCRIPTION_CONCURRENCY", 8))
+TABLE_DESCRIPTION_TIMEOUT = float(os.getenv("TABLE_DESCRIPTION_TIMEOUT", 300))
+# descriptions are kept there, per model, in files named after the hash of the table markdown
+TABLE_DESCRIPTION_CACHE_DIR = os.getenv(
+    "TABLE_DESCRIPTION_CACHE_DIR", os.path.join(os.path.expanduser("~"), "pdf-results", "table-descriptions")
+)
+
+TABLE_DESCRIPTION_PROMPT = """
+                        <s>[INST] <<SYS>>\n You are a helpful, respectful, and honest assistant. Your task is to generate a detailed and descriptive summary of the provided table data in Markdown format, based strictly on the table and its heading. <</SYS>>
+                        [INST] Your job is to create a clear, specific, and **factual** textual description. **Do not add any external information** or provide an abstract summary. Only base the description on the data from the table and its heading.
+
+                        1. Link the **columns** with the corresponding **values** in the rows, referencing the exact terms and terminology from the table.
+                        2. For each row, explain how each column's data relates to the corresponding values. Ensure the description is **step-by-step** and follows the structure of the table in a natural order.
+                        3. **Do not return the table itself.** Provide only the descriptive summary, written in **paragraphs**.
+                        4. The description should be precise, direct, and **avoid interpretation** or generalization. Stay true to the exact data given.
+
+                        Think carefully and make sure to describe every column and its respective values in detail.
+                    """
+
+
+class TableDescriptionStore:
+    """Content-addressed store of table descriptions on disk, keyed by the sha256 of the table markdown."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @staticmethod
+    def key(markdown: str) -> str:
+        return hashlib.sha256(markdown.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, description: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # readers, possibly other workers, never see a partial description
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(description)
+        os.replace(tmp_path, path)
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """`get` without blocking the event loop."""
+        return await asyncio.to_thread(self.get, key)
+
+    async def put_async(self, key: str, description: str):
+        """`put` without blocking the event loop."""
+        await asyncio.to_thread(self.put, key, description)
+
+
+class TableDescriber:
+    """Describes markdown tables with the LLM server, concurrently and once per distinct table.
+
+    Requests go through one pooled session, at most `concurrency` at a time, which `close` releases. Descriptions are
+    stored by the hash of the table, so tables seen before, in this document or an earlier one, are not sent to the
+    LLM again.
+    """
+
+    def __init__(
+        self,
+        store: Optional[TableDescriptionStore] = None,
+        concurrency: int = TABLE_DESCRIPTION_CONCURRENCY,
+        timeout: float = TABLE_DESCRIPTION_TIMEOUT,
+    ):
+        self.url = f"http://{LLM_SERVER_HOST_IP}:{LLM_SERVER_PORT}/v1/chat/completions"
+        if store is None:
+            store = TableDescriptionStore(os.path.join(TABLE_DESCRIPTION_CACHE_DIR, LLM_MODEL_ID or "default"))
+        self.store = store
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self._session = None
+        self._session_loop = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Return the session of the running event loop, (re)creating it if needed."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self._session = aiohttp.ClientSession(connector=connector, trust_env=True, timeout=timeout)
+            self._session_loop = loop
+        return self._session
+
+    def request_data(self, markdown: str, heading: str = "") -> dict:
+        data = {
+            "messages": [
+                {"role": "system", "content": TABLE_DESCRIPTION_PROMPT},
+                {"role": "user", "content": f"{heading}\n{markdown}"},
+            ],
+            "stream": False,
+        }
+        if LLM_USE_MODEL_PARAM and LLM_MODEL_ID:
+            data["model"] = LLM_MODEL_ID
+        else:
+            data["filename"] = ""
+        return data
+
+    async def describe(self, markdown: str, heading: str = "") -> str:
+        """Ask the LLM for the description of a markdown table."""
+        headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+        async with self.get_session().post(self.url, headers=headers, json=self.request_data(markdown, heading)) as r:
+            response_data = await r.json(content_type=None)
+        return response_data["choices"][0]["message"]["content"]
+
+    async def describe_all(self, tables: Iterable[str]) -> Dict[str, str]:
+        """Return the description of each markdown table, from the store or else the LLM."""
+        descriptions = {}
+        missing = []
+        for markdown in dict.fromkeys(tables):
+            description = await self.store.get_async(self.store.key(markdown))
+            if description is None:
+                missing.append(markdown)
+            else:
+                descriptions[markdown] = description
+        if logflag:
+            logger.info(f"Describing {len(missing)} tables, {len(descriptions)} already described")
+        if not missing:
+            return descriptions
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def describe(markdown):
+            async with semaphore:
+                description = await self.describe(markdown)
+            await self.store.put_async(self.store.key(markdown), description)
+            descriptions[markdown] = description
+
+        tasks = [asyncio.create_task(describe(markdown)) for markdown in missing]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            errors = [task.exception() for task in done if task.exception() is not None]
+            if errors:
+                raise errors[0]
+        finally:
+            # the first failure, or the cancellation of the caller, cancels the tables still being described
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return descriptions
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -43,3 +43,10 @@ class OpeaDataprepLoader(OpeaComponentLoader):
         if logflag:
             logger.info("[ dataprep loader ] get collections")
         return await self.component.get_list_of_collections(qdrant_host, qdrant_port)
+
+    async def close(self):
+        if logflag:
+            logger.info("[ dataprep loader ] close")
+        close = getattr(self.component, "close", None)
+        if close is not None:
+            await close()
@@ -139,7 +139,9 @@ async def ingest_files(
 
         if logflag:
             logger.info(f"[ ingest ] Output generated: {response}")
-        statistics_dict["opea_service@dataprep"].append_latency(time.time() - start, None)
+        statistics_dict["opea_service@dataprep"].append_latency(
+            time.time() - start, None, endpoint="/v1/dataprep/ingest"
+        )
         return response
     except Exception as e:
         logger.error(f"Error during dataprep ingest invocation: {e}")
@@ -183,7 +185,9 @@ async def get_files(
         if logflag:
             logger.info(f"[ get ] ingested files: {response}")
         # Record statistics
-        statistics_dict["opea_service@dataprep"].append_latency(time.time() - start, None)
+        statistics_dict["opea_service@dataprep"].append_latency(
+            time.time() - start, None, endpoint="/v1/dataprep/get"
+        )
         return response
     except Exception as e:
         logger.error(f"Error during dataprep get invocation: {e}")
@@ -228,7 +232,9 @@ async def delete_files(
         if logflag:
             logger.info(f"[ delete ] deleted result: {response}")
         # Record statistics
-        statistics_dict["opea_service@dataprep"].append_latency(time.time() - start, None)
+        statistics_dict["opea_service@dataprep"].append_latency(
+            time.time() - start, None, endpoint="/v1/dataprep/delete"
+        )
         return response
     except Exception as e:
         logger.error(f"Error during dataprep delete invocation: {e}")
@@ -260,7 +266,9 @@ async def get_list_of_collections(
         if logflag:
             logger.info(f"[ get ] list of collections: {response}")
 
-        statistics_dict["opea_service@dataprep"].append_latency(time.time() - start, None)
+        statistics_dict["opea_service@dataprep"].append_latency(
+            time.time() - start, None, endpoint="/v1/dataprep/collections"
+        )
         return response
     except Exception as e:
         logger.error(f"Error during dataprep get list of collections: {e}")
@@ -291,7 +299,9 @@ async def get_list_of_indices():
         if logflag:
             logger.info(f"[ get ] list of indices: {response}")
 
-        statistics_dict["opea_service@dataprep"].append_latency(time.time() - start, None)
+        statistics_dict["opea_service@dataprep"].append_latency(
+            time.time() - start, None, endpoint="/v1/dataprep/indices"
+        )
 
         return response
     except Exception as e:
@@ -301,4 +311,6 @@ async def get_list_of_indices():
 if __name__ == "__main__":
     logger.info(f"OPEA Dataprep Microservice is starting on port {DATAPREP_PORT}...")
     create_upload_folder(upload_folder)
+    # the pooled connections of the component are closed when each worker stops
+    opea_microservices["opea_service@dataprep"].add_shutdown_event(loader.close)
     opea_microservices["opea_service@dataprep"].start()
@@ -24,29 +24,15 @@ from urllib.parse import urlparse, urlunparse
 
 import aiofiles
 import aiohttp
-import cairosvg
-# import cv2
-import docx
-import docx2txt
-import fitz
 import numpy as np
-import pandas as pd
-import pptx
-import pytesseract
 import requests
 import yaml
-from bs4 import BeautifulSoup
-from langchain import LLMChain, PromptTemplate
-from langchain_community.document_loaders import (
-    UnstructuredHTMLLoader,
-    UnstructuredImageLoader,
-    UnstructuredMarkdownLoader,
-    UnstructuredXMLLoader,
-)
-from langchain_community.llms import HuggingFaceEndpoint
 
 from AIComps.tasks import CustomLogger
 
+# the document parsers (fitz, docx, pptx, pandas, cairosvg, bs4, langchain loaders) are imported by the loaders
+# using them, so importing this module, e.g. for create_upload_folder, stays fast
+
 logger = CustomLogger("prepare_doc_util")
 logflag = os.getenv("LOGFLAG", False)
 
@@ -139,6 +125,8 @@ def get_separators():
 
 
 def load_pdf(pdf_path):
+    import fitz
+
     doc = fitz.open(pdf_path)
     results = []
 
@@ -157,6 +145,8 @@ async def load_pdf_async(pdf_path):
 
 def load_html(html_path):
     """Load the html file."""
+    from langchain_community.document_loaders import UnstructuredHTMLLoader
+
     data_html = UnstructuredHTMLLoader(html_path).load()
     content = ""
     for ins in data_html:
@@ -198,6 +188,9 @@ async def load_doc(doc_path):
 
 async def load_docx(docx_path):
     """Load docx file."""
+    import docx
+    import docx2txt
+
     doc = await asyncio.to_thread(docx.Document, docx_path)
     text = ""
     # Save all 'rId:filenames' relationships in an dictionary and save the images if any.
@@ -264,6 +257,8 @@ async def load_ppt(ppt_path):
 
 async def load_pptx(pptx_path):
     """Load pptx file."""
+    import pptx
+
     text = ""
     prs = pptx.Presentation(pptx_path)
     for slide in prs.slides:
@@ -295,6 +290,8 @@ async def load_md(md_path):
     """Asynchronously load and process Markdown file."""
 
     def process_md():
+        from langchain_community.document_loaders import UnstructuredMarkdownLoader
+
         loader = UnstructuredMarkdownLoader(md_path)
         return loader.load()[0].page_content
 
@@ -305,6 +302,8 @@ async def load_xml(xml_path):
     """Asynchronously load and process XML file."""
 
     def process_xml():
+        from langchain_community.document_loaders import UnstructuredXMLLoader
+
         loader = UnstructuredXMLLoader(xml_path)
         return loader.load()[0].page_content
 
@@ -341,6 +340,8 @@ async def load_xlsx(input_path):
     """Asynchronously load and process an xlsx file."""
 
     def process_xlsx():
+        import pandas as pd
+
         df = pd.read_excel(input_path)
         return df.apply(lambda row: ", ".join(row.astype(str)), axis=1).tolist()
 
@@ -351,6 +352,8 @@ async def load_csv(input_path):
     """Asynchronously load and process CSV file."""
 
     def process_csv():
+        import pandas as pd
+
         df = pd.read_csv(input_path)
         return df.apply(lambda row: ", ".join(row.astype(str)), axis=1).tolist()
 
@@ -377,6 +380,8 @@ async def load_image(image_path):
         return json_data["text"].strip()
 
     def load_text_from_image():
+        from langchain_community.document_loaders import UnstructuredImageLoader
+
         loader = UnstructuredImageLoader(image_path)
         return loader.load()[0].page_content.strip()
 
@@ -386,6 +391,8 @@ async def load_image(image_path):
 
 async def load_svg(svg_path):
     """Load the svg file."""
+    import cairosvg
+
     png_path = svg_path.replace(".svg", ".png")
     cairosvg.svg2png(url=svg_path, write_to=png_path)
     text = await load_image(png_path)
@@ -586,6 +593,8 @@ class Crawler:
                 depth += 1
 
     def parse(self, html_doc):
+        from bs4 import BeautifulSoup
+
         soup = BeautifulSoup(html_doc, "lxml")
         return soup
 
@@ -786,6 +795,9 @@ def get_tables_result(pdf_path, table_strategy):
 
 
 def llm_generate(content):
+    from langchain import LLMChain, PromptTemplate
+    from langchain_community.llms import HuggingFaceEndpoint
+
     llm_endpoint = os.getenv("TGI_LLM_ENDPOINT", "http://localhost:8080")
     llm = HuggingFaceEndpoint(
         endpoint_url=llm_endpoint,
@@ -78,7 +78,8 @@ class OpeaQDrantRetriever(OpeaComponent):
 
         collection_name = input.collection_name or QDRANT_INDEX_NAME
         db_store, retriever = self._initialize_client(collection_name, host, port)
-        search_res = retriever.run(query_embedding=input.embedding)["documents"]
+        # base64 embeddings are only decoded here, straight to a float32 array
+        search_res = retriever.run(query_embedding=input.embedding_array().tolist())["documents"]
 
         # format result to align with the standard output in opea_retrievers_microservice.py
         final_res = []
@@ -0,0 +1,133 @@
+# Copyright (C) 2024 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import unused_port
+
+from AIComps.tasks import MicroService, ServiceOrchestrator, ServiceType
+
+
+@pytest.fixture
+async def backend():
+    """Serve /<name> endpoints, each replying with its reply dict, and count the calls to each."""
+    calls = {}
+    replies = {}
+
+    async def handle(request):
+        name = request.match_info["name"]
+        calls[name] = calls.get(name, 0) + 1
+        await asyncio.sleep(replies[name].pop("delay", 0))
+        return web.json_response(replies[name])
+
+    app = web.Application()
+    app.router.add_post("/{name}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = unused_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    yield port, calls, replies
+    await runner.cleanup()
+
+
+def make_orchestrator(port, replies, nodes, edges, **kwargs):
+    orchestrator = ServiceOrchestrator(**kwargs)
+    services = {}
+    for name, reply in nodes.items():
+        replies[name] = reply
+        services[name] = MicroService(
+            name=name,
+            host="127.0.0.1",
+            port=port,
+            endpoint=f"/{name}",
+            use_remote_service=True,
+            service_type=ServiceType.UNDEFINED,
+        )
+        orchestrator.add(services[name])
+    for from_node, to_node in edges:
+        orchestrator.flow_to(services[from_node], services[to_node])
+    return orchestrator
+
+
+async def test_black_list_skips_one_edge_of_a_join(backend):
+    port, calls, replies = backend
+    orchestrator = make_orchestrator(
+        port,
+        replies,
+        {
+            "alpha": {"text": "a", "downstream_black_list": ["gamma"]},
+            "beta": {"text": "b", "delay": 0.1},
+            "gamma": {"text": "g"},
+        },
+        [("alpha", "gamma"), ("beta", "gamma")],
+    )
+    result_dict, runtime_graph = await orchestrator.schedule({"text": "q"})
+    await orchestrator.close()
+
+    # gamma is still fed by beta, only the alpha -> gamma edge is skipped
+    assert calls == {"alpha": 1, "beta": 1, "gamma": 1}
+    assert runtime_graph.predecessors("gamma/MicroService") == ["beta/MicroService"]
+    assert "gamma/MicroService" in orchestrator.get_all_final_outputs(result_dict, runtime_graph)
+
+
+async def test_black_list_of_a_join_finishing_last(backend):
+    port, calls, replies = backend
+    orchestrator = make_orchestrator(
+        port,
+        replies,
+        {
+            "alpha": {"text": "a", "downstream_black_list": ["gamma"], "delay": 0.1},
+            "beta": {"text": "b"},
+            "gamma": {"text": "g"},
+        },
+        [("alpha", "gamma"), ("beta", "gamma")],
+    )
+    await orchestrator.schedule({"text": "q"})
+    await orchestrator.close()
+
+    assert calls == {"alpha": 1, "beta": 1, "gamma": 1}
+
+
+async def test_node_black_listed_by_every_predecessor_is_skipped(backend):
+    port, calls, replies = backend
+    orchestrator = make_orchestrator(
+        port,
+        replies,
+        {
+            "guard": {"text": "a", "downstream_black_list": ["llm"]},
+            "llm": {"text": "g"},
+            "tts": {"text": "t"},
+        },
+        [("guard", "llm"), ("llm", "tts")],
+    )
+    result_dict, runtime_graph = await orchestrator.schedule({"text": "q"})
+    await orchestrator.close()
+
+    assert calls == {"guard": 1}
+    assert list(orchestrator.get_all_final_outputs(result_dict, runtime_graph)) == ["guard/MicroService"]
+
+
+async def test_pruning_black_listed_nodes_cancels_their_branches(backend):
+    port, calls, replies = backend
+    orchestrator = make_orchestrator(
+        port,
+        replies,
+        {
+            "guard": {"text": "a", "downstream_black_list": ["llm"]},
+            "retriever": {"text": "b", "delay": 2},
+            "llm": {"text": "g"},
+        },
+        [("guard", "llm"), ("retriever", "llm")],
+        prune_black_listed_nodes=True,
+    )
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    result_dict, runtime_graph = await orchestrator.schedule({"text": "q"})
+    await orchestrator.close()
+
+    # the retriever only fed the llm, its request is cancelled rather than awaited
+    assert loop.time() - start < 2
+    assert "llm" not in calls
+    assert list(orchestrator.get_all_final_outputs(result_dict, runtime_graph)) == ["guard/MicroService"]